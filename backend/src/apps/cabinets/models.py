@@ -9,6 +9,9 @@ class History(TortoiseModel):
     date_time = fields.DatetimeField(auto_now=True)
     user = fields.ForeignKeyField("models.User")
 
+    class Meta:
+        indexes = (("user_id", "date_time", "id"),)
+
     @classmethod
     def all(cls, using_db=None):
         return (
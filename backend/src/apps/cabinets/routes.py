@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Request, Depends
+from fastapi import APIRouter, Request, Response, Depends
 from fastapi.responses import FileResponse, RedirectResponse
 
 from .dependencies import HistoryParser
@@ -6,23 +6,31 @@ from .models import History
 from .schemas import HistoryListSchema
 from .services import delete_history
 from ..users.permissions import login_required
+from src.base.pagination import Pagination, get_pagination, paginate, NEXT_CURSOR_HEADER
+from src.base.responses import schema_response
 
 router = APIRouter(prefix="/cabinet", tags=["Cabinets"])
 
 
 @router.get('/history', response_model=list[HistoryListSchema])
 @login_required
-async def history_list_view(request: Request):
-    """History view."""
-    history_list = await History.filter(user__id=request.user.id).select_related("formula", "formula__category")
-    return [
+async def history_list_view(request: Request, response: Response, pagination: Pagination = Depends(get_pagination)):
+    """History view, latest records first, the next page cursor is in X-Next-Cursor header."""
+    history_list, next_cursor = await paginate(
+        History.filter(user__id=request.user.id).select_related("formula", "formula__category"),
+        ("-date_time", "-id"),
+        pagination
+    )
+    if next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return schema_response(list[HistoryListSchema], [
         {
             **history.as_dict(),
             "formula": history.formula.as_dict(),
             "category": history.formula.category.as_dict(),
         }
         for history in history_list
-    ]
+    ], response)
 
 
 @router.post('/history/download')
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from functools import wraps
+from typing import Any, Awaitable, Callable, Optional
+
+from aioredis import Redis
+from aioredis.exceptions import RedisError
+from fastapi import Request, Response
+from tortoise.signals import post_delete, post_save
+
+from src.db.redis import create_redis_client
+from src.db.transactions import on_commit
+from .models import Science, Category, Formula
+
+CATALOG_CHANNEL = "catalog:invalidate"
+CATALOG_VERSION_KEY = "catalog:version"
+CATALOG_MODIFIED_KEY = "catalog:modified"
+CATALOG_RECONNECT_DELAY = 1
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogCache:
+    """
+    Per-worker in-memory cache of catalog responses: sciences, categories and formulas.
+    Every write increments the catalog version in Redis and publishes it to all workers,
+    which drop their entries. Entries loaded concurrently with an invalidation are not stored.
+    The cache is bypassed while the worker isn't subscribed to invalidations.
+    """
+
+    def __init__(self):
+        self.redis: Optional[Redis] = None
+        self.version = 0
+        self.modified = time.time()
+        self.listening = False
+        self._generation = 0
+        self._entries: dict[str, Any] = {}
+
+    async def get_or_load(self, key: str, load: Callable[[], Awaitable[Any]]) -> Any:
+        """:return cached value of the key, loading and caching it on miss."""
+        if self.listening and key in self._entries:
+            return self._entries[key]
+        generation = self._generation
+        value = await load()
+        if self.listening and generation == self._generation:
+            self._entries[key] = value
+        return value
+
+    def reset(self, version: int, modified: float) -> None:
+        self.version, self.modified = version, modified
+        self._generation += 1
+        self._entries.clear()
+
+    def invalidate(self, version: int, modified: float) -> None:
+        """Drop all entries, the catalog has changed up to `version` at `modified` time."""
+        self.reset(*max((self.version, self.modified), (version, modified)))
+
+    def get_validators(self) -> Optional[tuple[str, float]]:
+        """:return weak ETag and modification time of the catalog version, None if the version isn't known."""
+        if not self.listening:
+            return None
+        # versions repeat if Redis loses them, modification time tells such versions apart
+        return f'W/"catalog-{self.version}-{int(self.modified * 1_000_000)}"', self.modified
+
+    async def publish_invalidation(self) -> None:
+        """
+        Invalidate the catalog in every worker. Save signals of writes in atomic blocks publish it after commit,
+        so other workers don't reload rows not committed yet.
+        """
+        if self.redis is None:     # processes without the listener publish with a client of their own
+            self.redis = create_redis_client()
+        redis = self.redis
+        modified = time.time()
+        try:
+            version = await redis.incr(CATALOG_VERSION_KEY)
+            await redis.set(CATALOG_MODIFIED_KEY, modified)
+            await redis.publish(CATALOG_CHANNEL, f"{version} {modified}")
+        except RedisError as e:
+            logger.warning("Catalog invalidation isn't published: %s", e)
+            version = self.version + 1
+        self.invalidate(version, modified)
+
+    async def listen(self, redis: Redis) -> None:
+        """Keep the cache subscribed to invalidations, resubscribing after Redis failures."""
+        self.redis = redis
+        while True:
+            pubsub = redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(CATALOG_CHANNEL)
+                # invalidations could be missed while unsubscribed
+                await redis.set(CATALOG_MODIFIED_KEY, time.time(), nx=True)
+                version, modified = await redis.mget(CATALOG_VERSION_KEY, CATALOG_MODIFIED_KEY)
+                self.reset(int(version or 0), float(modified))
+                self.listening = True
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        version, modified = message["data"].split()
+                        self.invalidate(int(version), float(modified))
+            except (RedisError, OSError) as e:
+                logger.warning("Catalog cache is bypassed, invalidations are unavailable: %s", e)
+            finally:
+                self.listening = False
+                self._entries.clear()
+                try:
+                    await pubsub.close()
+                except (RedisError, OSError):
+                    pass
+            await asyncio.sleep(CATALOG_RECONNECT_DELAY)
+
+
+catalog_cache = CatalogCache()
+
+
+def is_not_modified(request: Request, etag: str, modified: float) -> bool:
+    """Whether the client has the resource of `etag`, If-None-Match takes precedence over If-Modified-Since."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag.removeprefix("W/") in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None:
+        return False
+    try:
+        return int(modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def conditional_catalog(view_func: Callable):
+    """
+    Decorator for catalog views to set validators of the catalog version
+    and answer 304 to clients having the current version, before the view queries anything.
+    """
+
+    @wraps(view_func)
+    async def inner(request: Request, *args, response: Response, **kwargs):
+        validators = catalog_cache.get_validators()
+        if validators is not None:
+            etag, modified = validators
+            headers = {"ETag": etag, "Last-Modified": formatdate(modified, usegmt=True), "Cache-Control": "no-cache"}
+            if is_not_modified(request, etag, modified):
+                return Response(status_code=304, headers=headers)
+            response.headers.update(headers)
+        return await view_func(request, *args, response=response, **kwargs)
+
+    return inner
+
+
+@post_save(Science, Category, Formula)
+async def catalog_saved(sender, instance, created, using_db, update_fields) -> None:
+    await on_commit(catalog_cache.publish_invalidation)
+
+
+@post_delete(Science, Category, Formula)
+async def catalog_deleted(sender, instance, using_db) -> None:
+    await on_commit(catalog_cache.publish_invalidation)
@@ -1,5 +1,8 @@
+from functools import lru_cache
+
 from fastapi import Request, Depends, HTTPException
 from .repositories import FormulaRepository
+from src.services.formulas.plots_cache import PlotCache, PLOTS_CACHE_DIR
 
 from .models import Science, Formula, Category
 
@@ -38,7 +41,16 @@ async def get_science_dependency(science_slug: str) -> Science:
 
 
 async def get_category_dependency(category_slug: str) -> Category:
-    category = await Category.get_or_none(slug=category_slug)
+    category = await Category.filter(slug=category_slug).select_related("science").first()
     if category is None:
         raise HTTPException(status_code=404, detail="Category is not found.")
     return category
+
+
+@lru_cache
+def get_directory_plot_cache(directory: str) -> PlotCache:
+    return PlotCache(directory)
+
+
+def get_plot_cache(request: Request) -> PlotCache:
+    return get_directory_plot_cache(request.app.state.STATIC_DIR + PLOTS_CACHE_DIR)
@@ -1,7 +1,10 @@
 from tortoise import fields
-from tortoise.functions import Count
+from tortoise.expressions import F, RawSQL
 
 from src.base.models import TortoiseModel
+from src.db.transactions import atomic
+
+FORMULAS_COUNT_SQL = '(SELECT COUNT(*) FROM "formula" WHERE "formula"."category_id" = "category"."id")'
 
 
 class Science(TortoiseModel):
@@ -17,7 +20,7 @@ class Science(TortoiseModel):
         return self.title
 
     async def get_categories(self):
-        return await Category.annotate(formulas_count=Count("formulas")).filter(science=self)
+        return await Category.filter(science=self)
 
 
 class Category(TortoiseModel):
@@ -30,6 +33,8 @@ class Category(TortoiseModel):
     )
     slug = fields.CharField(max_length=40, unique=True, index=True)
     is_special = fields.BooleanField(default=False)
+    # maintained by Formula.save and Formula.delete, bulk queries should be followed by recount_formulas
+    formulas_count = fields.IntField(default=0)
 
     class Meta:
         ordering = ["title"]
@@ -46,6 +51,15 @@ class Category(TortoiseModel):
             .select_related("science")
         )
 
+    @classmethod
+    async def recount_formulas(cls) -> int:
+        """Recompute formulas counts of all categories."""
+        return await cls.all().update(formulas_count=RawSQL(FORMULAS_COUNT_SQL))
+
+    @classmethod
+    async def add_formulas(cls, category_id: str, count: int, using_db=None) -> None:
+        await cls.filter(id=category_id).using_db(using_db).update(formulas_count=F("formulas_count") + count)
+
 
 class Formula(TortoiseModel):
     title = fields.CharField(max_length=40, unique=True, index=True)
@@ -59,9 +73,32 @@ class Formula(TortoiseModel):
     slug = fields.CharField(max_length=40, unique=True, index=True)
     data = fields.JSONField(null=True)
 
+    class Meta:
+        indexes = (("category_id", "title"),)
+
     def __str__(self):
         return self.title
 
+    async def save(self, using_db=None, update_fields=None, force_create=False, force_update=False) -> None:
+        async with atomic(using_db) as connection:
+            previous_category_id = self.category_id if self._saved_in_db else None
+            if self._saved_in_db and (update_fields is None or {"category", "category_id"} & set(update_fields)):
+                # the formula could be moved to another category
+                previous_category_id = await (
+                    Formula.filter(id=self.pk).using_db(connection).select_for_update()
+                    .first().values_list("category_id", flat=True)
+                )
+            await super().save(connection, update_fields, force_create, force_update)
+            if previous_category_id != self.category_id:
+                if previous_category_id is not None:
+                    await Category.add_formulas(previous_category_id, -1, connection)
+                await Category.add_formulas(self.category_id, 1, connection)
+
+    async def delete(self, using_db=None) -> None:
+        async with atomic(using_db) as connection:
+            await super().delete(connection)
+            await Category.add_formulas(self.category_id, -1, connection)
+
     @classmethod
     def get_or_none(cls, *args, using_db=None, **kwargs):
         return (
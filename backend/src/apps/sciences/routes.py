@@ -1,17 +1,28 @@
-from fastapi import APIRouter, Request, Body, Depends
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import APIRouter, Request, Body, Depends, Path, BackgroundTasks
+from fastapi.responses import FileResponse, JSONResponse, Response
+from urllib.parse import quote
+import numpy as np
 import os
 
 from .models import Science, Category, Formula
 from ..cabinets.models import History
 from ..users.permissions import login_required
-from ...services.formulas import counter, mathem_extra_counter
-from src.services.formulas.plots import Plot
-from .schemas import RequestSchema, RequestData, DownloadPlot, PlotData, EquationsData, \
-    ScienceDetailSchema, CategoryDetailSchema, ScienceListSchema, FormulaDetailSchema
+from ...services.formulas import cache, counter, mathem_extra_counter
+from src.services.formulas.plots import Curve, IMAGE_MEDIA_TYPES, render_plot_bytes_async, \
+    render_surface_bytes_async, sample_surface, sample_formula_async, downsample_lttb, render_formula_bytes_async, \
+    plot_points_async
+from src.services.formulas.plots_cache import PlotCache, PLOTS_CACHE_DIR, link_user_plot
+from .schemas import RequestSchema, RequestData, DownloadPlot, PlotData, PlotPointsData, PlotImageData, \
+    SurfacePlotData, FormulaPlotData, EquationsData, EquationsBatchData, ScienceDetailSchema, CategoryDetailSchema, \
+    ScienceListSchema, FormulaDetailSchema, ScienceSnapshotSchema
 from src.services.formulas.metadata import Formula as FormulaObject
+from .catalog import catalog_cache, conditional_catalog
+from .snapshot import snapshot_cache
+from src.db.queries import query_budget
+from src.base.pagination import Pagination, get_pagination, paginate, NEXT_CURSOR_HEADER
+from src.base.responses import schema_response
 from .dependencies import get_formula_dependency, get_science_dependency, \
-    get_category_dependency
+    get_category_dependency, get_plot_cache
 
 router = APIRouter(prefix='/sciences', tags=['Sciences'])
 PLOTS_DIR = "files/plots/"
@@ -19,6 +30,15 @@ PLOTS_DIR = "files/plots/"
 
 # ================================= PLOTS ================================ #
 
+def get_plot_functions(data: PlotData) -> list[str | Curve]:
+    """Functions, then parametric and polar curves of the plot."""
+    return [
+        *data.functions,
+        *(Curve("parametric", (curve.x, curve.y), (curve.t_min, curve.t_max)) for curve in data.parametric),
+        *(Curve("polar", (curve.r, ), (curve.theta_min, curve.theta_max)) for curve in data.polar),
+    ]
+
+
 @router.get('/special-category/plots')
 async def plots_view(request: Request):
     """Plot get endpoint."""
@@ -28,24 +48,33 @@ async def plots_view(request: Request):
         "category": category
     }
     if request.user:
-        plot_path = PLOTS_DIR + f'/{request.user.id}.png'
+        plot_path = PLOTS_DIR + f'{request.user.id}.png'
         full_plot_path = request.app.state.STATIC_DIR + plot_path
         if os.path.exists(full_plot_path):
+            if os.path.islink(full_plot_path):  # link to the cached image
+                plot_path = PLOTS_DIR + os.readlink(full_plot_path)
             data.update(plotPath=plot_path)
     return data
 
 
 @router.post('/special-category/plots')
 @login_required
-async def plots_view_post(request: Request, data: PlotData = Body()):
+async def plots_view_post(
+        request: Request,
+        background_tasks: BackgroundTasks,
+        data: PlotData = Body(),
+        plot_cache: PlotCache = Depends(get_plot_cache),
+):
     """Plot file view"""
-    if data.functions:
+    functions = get_plot_functions(data)
+    if functions:
         try:
-            plot = Plot(data.functions, data.x_lim, data.y_lim)
-            plot_path = PLOTS_DIR + f'{request.user.id}.png'
-            full_plot_path = request.app.state.STATIC_DIR + plot_path
-            print(full_plot_path)
-            plot.save_plot(full_plot_path)
+            plot_hash = await plot_cache.render(functions, data.x_lim, data.y_lim)
+            link_user_plot(
+                request.app.state.STATIC_DIR + PLOTS_DIR + f'{request.user.id}.png',
+                plot_cache.get_path(plot_hash),
+            )
+            background_tasks.add_task(plot_cache.evict)
         except (SyntaxError, NameError):
             message = "Невалидные данные."
         except TypeError:
@@ -57,12 +86,133 @@ async def plots_view_post(request: Request, data: PlotData = Body()):
         except ValueError as e:  # raises from Plot class
             message = str(e)
         else:
-            return {"plotPath": plot_path}
+            return {
+                "plotPath": PLOTS_CACHE_DIR + f"{plot_hash}.png",
+                "plotUrl": str(request.url_for("plots_image_view", plot_hash=plot_hash)),
+            }
     else:
         message = "Неполные данные."
     return {"detail": message}
 
 
+@router.get('/special-category/plots/{plot_hash}.png')
+async def plots_image_view(
+        request: Request,
+        plot_hash: str = Path(pattern=r"^[0-9a-f]{64}$"),
+        plot_cache: PlotCache = Depends(get_plot_cache),
+):
+    """Cached plot image, its content never changes for the hash."""
+    full_plot_path = plot_cache.get(plot_hash)
+    if full_plot_path is None:
+        return JSONResponse({"detail": "Plot is not found."}, 404)
+    headers = {"ETag": f'"{plot_hash}"', "Cache-Control": "public, max-age=31536000, immutable"}
+    if request.headers.get("if-none-match") in (f'"{plot_hash}"', "*"):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path=full_plot_path, media_type="image/png", headers=headers)
+
+
+@router.post('/special-category/plots/data')
+@login_required
+async def plots_data_view_post(request: Request, data: PlotPointsData = Body()):
+    """
+    Sampled points of every function for client-side rendering,
+    downsampled to the requested width. Implicit curves are nan-separated segments, not downsampled.
+    JSON or little-endian float32 `x` and `y` arrays of every function one after another.
+    """
+    functions = get_plot_functions(data)
+    if not functions:
+        return JSONResponse({"detail": "Неполные данные."}, 400)
+    try:
+        points = await plot_points_async(functions, data.x_lim, data.width, data.y_lim)
+    except (SyntaxError, NameError):
+        message = "Невалидные данные."
+    except TypeError:
+        message = "Ожидаются рациональные числа."
+    except ArithmeticError:
+        message = "Вычислительно невозможное выражение"
+    except ValueError as e:  # raises from Plot class
+        message = str(e)
+    else:
+        if data.format == "float32":
+            return Response(
+                content=np.concatenate([np.r_[x, y] for x, y in points]).astype("<f4").tobytes(),
+                media_type="application/octet-stream",
+                headers={"X-Plot-Lengths": ",".join(str(len(x)) for x, _ in points)},
+            )
+        return {
+            "functions": [
+                {
+                    "function": str(function),
+                    "x": [value if np.isfinite(value) else None for value in x.tolist()],
+                    "y": [value if np.isfinite(value) else None for value in y.tolist()],
+                }
+                for function, (x, y) in zip(functions, points)
+            ]
+        }
+    return JSONResponse({"detail": message}, 400)
+
+
+@router.post('/special-category/plots/image')
+@login_required
+async def plots_image_view_post(request: Request, data: PlotImageData = Body()):
+    """Plot rendered in memory and returned in the response body, nothing is stored on disk."""
+    functions = get_plot_functions(data)
+    if not functions:
+        return JSONResponse({"detail": "Неполные данные."}, 400)
+    try:
+        image, image_format = await render_plot_bytes_async(functions, data.x_lim, data.y_lim, data.format)
+    except (SyntaxError, NameError):
+        message = "Невалидные данные."
+    except TypeError:
+        message = "Ожидаются рациональные числа."
+    except ArithmeticError:
+        message = "Вычислительно невозможное выражение"
+    except ValueError as e:  # raises from Plot class
+        message = str(e)
+    else:
+        headers = {}
+        if data.filename:
+            headers["Content-Disposition"] = f"attachment; filename*=utf-8''{quote(data.filename)}.{image_format}"
+        return Response(content=image, media_type=IMAGE_MEDIA_TYPES[image_format], headers=headers)
+    return JSONResponse({"detail": message}, 400)
+
+
+@router.post('/special-category/plots/surface')
+@login_required
+async def plots_surface_view_post(request: Request, data: SurfacePlotData = Body()):
+    """
+    Functions of two arguments as surface, heatmap or contour image.
+    `grid` kind returns little-endian float32 `z` values of the first function row by row
+    for client-side rendering, the grid shape is in `X-Grid-Shape` header.
+    """
+    if not data.functions:
+        return JSONResponse({"detail": "Неполные данные."}, 400)
+    try:
+        if data.kind == "grid":
+            _, _, z = sample_surface(data.functions[0], data.x_lim, data.y_lim, data.resolution)
+        else:
+            image, image_format = await render_surface_bytes_async(
+                data.functions, data.x_lim, data.y_lim, data.kind, data.resolution, data.format,
+            )
+    except (SyntaxError, NameError):
+        message = "Невалидные данные."
+    except TypeError:
+        message = "Ожидаются рациональные числа."
+    except ArithmeticError:
+        message = "Вычислительно невозможное выражение"
+    except ValueError as e:  # raises from Plot class
+        message = str(e)
+    else:
+        if data.kind == "grid":
+            return Response(
+                content=z.astype("<f4").tobytes(),
+                media_type="application/octet-stream",
+                headers={"X-Grid-Shape": ",".join(map(str, z.shape))},
+            )
+        return Response(content=image, media_type=IMAGE_MEDIA_TYPES[image_format])
+    return JSONResponse({"detail": message}, 400)
+
+
 @router.post('/special-category/plots/download')
 @login_required
 async def plots_view_download(request: Request, filedata: DownloadPlot = Body()):
@@ -92,8 +242,15 @@ async def equations_view(request: Request):
 @login_required
 async def equations_view_post(request: Request, data: EquationsData = Body()):
     message = result = ""
-    if len(data.equations) > 0:
-        result = mathem_extra_counter.equation_system(data.equations)
+    if len(data.equations) > 0 and data.numeric:
+        return mathem_extra_counter.numeric_equation_system(
+            data.equations,
+            initial_guess=data.initial_guess,
+            tolerance=data.tolerance,
+            max_iterations=data.max_iterations,
+        )
+    elif len(data.equations) > 0:
+        result = await cache.cached_equation_system(request.app.state.redis, data.equations, data.exact)
     else:
         message = "Данные не предоставлены."
     if not message:
@@ -101,63 +258,128 @@ async def equations_view_post(request: Request, data: EquationsData = Body()):
     return {"detail": message}
 
 
+@router.post('/special-category/equations/batch')
+@login_required
+async def equations_batch_view_post(request: Request, data: EquationsBatchData = Body()):
+    """Solve one templated linear system for every set of coefficients."""
+    if not data.equations:
+        return JSONResponse({"detail": "Данные не предоставлены."}, 400)
+    try:
+        return mathem_extra_counter.batch_linear_system(data.equations, data.coefficients)
+    except ValueError as e:
+        message = str(e)
+    except Exception:
+        message = "Ошибка в написании уравнения!"
+    return JSONResponse({"detail": message}, 400)
+
+
 @router.get('/', response_model=list[ScienceListSchema])
-async def sciences_list_view():
-    """All sciences list endpoint."""
-    sciences = await Science.all()
-    return sciences
+@query_budget(1)
+@conditional_catalog
+async def sciences_list_view(request: Request, response: Response, pagination: Pagination = Depends(get_pagination)):
+    """All sciences list endpoint, the next page cursor is in X-Next-Cursor header."""
+    async def load():
+        sciences, next_cursor = await paginate(Science.all(), ("title",), pagination)
+        return [science.as_dict() for science in sciences], next_cursor
+
+    # only first pages are cached, cursors are unbounded
+    if pagination.cursor is None:
+        sciences, next_cursor = await catalog_cache.get_or_load(f"sciences:{pagination.limit}", load)
+    else:
+        sciences, next_cursor = await load()
+    if next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return schema_response(list[ScienceListSchema], sciences, response)
+
+
+@router.get('/snapshot', response_model=list[ScienceSnapshotSchema])
+@query_budget(3)
+@conditional_catalog
+async def catalog_snapshot_view(request: Request, response: Response):
+    """Whole catalog tree endpoint, built and compressed once per catalog version."""
+    snapshot = await snapshot_cache.get()
+    return snapshot.response(request.headers.get("accept-encoding", ""), response.headers)
 
 
 @router.get('/science/{science_slug}', response_model=ScienceDetailSchema)
-async def science_detail_view(science: Science = Depends(get_science_dependency)):
+@query_budget(2)
+@conditional_catalog
+async def science_detail_view(request: Request, response: Response, science_slug: str):
     """Science detail endpoint."""
-    return {
-        **science.as_dict(),
-        "categories": [
-            {
-                **category.as_dict(),
-                "formulas_count": category.formulas_count
-            } for category in await science.get_categories()
-        ]
-    }
+    async def load():
+        categories = await Category.filter(science__slug=science_slug).select_related("science")
+        # science without categories is loaded alone
+        science = categories[0].science if categories else await get_science_dependency(science_slug)
+        return {
+            **science.as_dict(),
+            "categories": [category.as_dict() for category in categories]
+        }
+
+    science = await catalog_cache.get_or_load(f"science:{science_slug}", load)
+    return schema_response(ScienceDetailSchema, science, response)
 
 
 @router.get('/category/{category_slug}', response_model=CategoryDetailSchema)
+@query_budget(2)
+@conditional_catalog
 async def category_detail_view(
         request: Request,
-        category: Category = Depends(get_category_dependency),
+        response: Response,
+        category_slug: str,
+        pagination: Pagination = Depends(get_pagination)
 ):
-    """Category GET view."""
-    return {
-        **category.as_dict(),
-        "science": category.science.as_dict(),
-        "formulas": [f.as_dict() for f in category.formulas]
-    }
+    """Category GET view, formulas are paginated by the cursor in X-Next-Cursor header."""
+    async def load():
+        formulas, next_cursor = await paginate(
+            Formula.filter(category__slug=category_slug).select_related("category__science"), ("title",), pagination
+        )
+        # category without formulas on the page is loaded alone
+        category = formulas[0].category if formulas else await get_category_dependency(category_slug)
+        return {
+            **category.as_dict(),
+            "science": category.science.as_dict(),
+            "formulas": [f.as_dict() for f in formulas]
+        }, next_cursor
+
+    if pagination.cursor is None:
+        category, next_cursor = await catalog_cache.get_or_load(f"category:{category_slug}:{pagination.limit}", load)
+    else:
+        category, next_cursor = await load()
+    if next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return schema_response(CategoryDetailSchema, category, response)
 
 
 @router.get('/formula/{formula_slug}', response_model=FormulaDetailSchema)
+@query_budget(1)
+@conditional_catalog
 async def formula_detail_view(
-        formula: Formula = Depends(get_formula_dependency),
+        request: Request,
+        response: Response,
+        formula_slug: str,
         # formula_repository: FormulaRepository = Depends(get_formula_mongo_repository)
 ):
     """Science GET view."""
-    # formula_data = await formula_repository.get(slug=formula.slug)
-    formula_obj = FormulaObject.from_dict(formula.data)
-    if formula_obj is None:
-        return JSONResponse(
-            {
-                "detail": "Cannot find formula metadata.",
-                "category": formula.category.as_dict(),
-                "science": (await Science.get(id=formula.category.science_id)).as_dict(),
-            },
-            status_code=404
-        )
-    return {
-        **formula.as_dict(),
-        "category": formula.category.as_dict(),
-        "science": (await Science.get(id=formula.category.science_id)).as_dict(),
-        "info": formula_obj.as_dict()
-    }
+    async def load():
+        formula = await get_formula_dependency(formula_slug)
+        # formula_data = await formula_repository.get(slug=formula.slug)
+        formula_obj = FormulaObject.from_dict(formula.data)
+        data = {
+            "category": formula.category.as_dict(),
+            "science": formula.category.science.as_dict(),
+        }
+        if formula_obj is None:
+            return {"detail": "Cannot find formula metadata.", **data}
+        return {
+            **formula.as_dict(),
+            **data,
+            "info": formula_obj.as_dict()
+        }
+
+    formula_data = await catalog_cache.get_or_load(f"formula:{formula_slug}", load)
+    if "info" not in formula_data:
+        return JSONResponse(formula_data, status_code=404)
+    return schema_response(FormulaDetailSchema, formula_data, response)
 
 
 @router.post('/formula/{formula_slug}')
@@ -176,7 +398,7 @@ async def formula_calculate_view(
         user_id=request.user.id,
         **request_data.model_dump()
     )
-    result, is_success = counter.count_result(
+    result, is_success, sensitivities = counter.count_result(
         request=request_schema,
         formula_obj=formula_obj,
     )
@@ -186,5 +408,47 @@ async def formula_calculate_view(
             user_id=request.user.id,
             result=result
         )
+        if sensitivities is not None:
+            return JSONResponse({"result": result, "sensitivities": sensitivities}, 200)
         return JSONResponse({"result": result}, 200)
     return JSONResponse({"detail": result}, 400)
+
+
+@router.post('/formula/{formula_slug}/plot')
+@login_required
+async def formula_plot_view(
+        request: Request,
+        formula: Formula = Depends(get_formula_dependency),
+        data: FormulaPlotData = Body(),
+):
+    """
+    Formula solved for `findMark` as a function of `argument` literal, other literals fixed to `values`.
+    Points of every solution branch downsampled to `width` in JSON, or the rendered plot.
+    """
+    formula_obj = FormulaObject.from_dict(formula.data)
+    if formula_obj is None:
+        return JSONResponse({"detail": "Cannot find formula metadata."}, 404)
+    args = (formula_obj, data.find_mark, data.argument, data.values, data.units, data.x_lim, data.y_lim)
+    try:
+        if data.format == "json":
+            branches, (x_label, y_label) = await sample_formula_async(*args)
+        else:
+            image, image_format = await render_formula_bytes_async(*args, data.format)
+    except TypeError:
+        message = "Ожидаются рациональные числа."
+    except ArithmeticError:
+        message = "Вычислительно невозможное выражение"
+    except ValueError as e:  # raises from plots module
+        message = str(e)
+    else:
+        if data.format != "json":
+            return Response(content=image, media_type=IMAGE_MEDIA_TYPES[image_format])
+        return {
+            "xLabel": x_label,
+            "yLabel": y_label,
+            "branches": [
+                {"x": x.tolist(), "y": [value if np.isfinite(value) else None for value in y.tolist()]}
+                for x, y in (downsample_lttb(x, y, data.width) for x, y in branches)
+            ],
+        }
+    return JSONResponse({"detail": message}, 400)
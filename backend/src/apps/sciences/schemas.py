@@ -1,4 +1,7 @@
-from pydantic import BaseModel, Field
+from math import tau
+from typing import Literal
+
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class RequestSchema(BaseModel):
@@ -10,16 +13,33 @@ class RequestSchema(BaseModel):
     find_mark: str = "x"
     user_id: str | int | None = None
     nums_comma: int = 10
+    sensitivities: bool = False
 
 
 class RequestData(BaseModel):
     data: dict | None = None
     find_mark: str = Field(default=10, alias="findMark")
     nums_comma: int = Field(default=10, alias="numsComma")
+    sensitivities: bool = False
+
+
+class ParametricCurveData(BaseModel):
+    x: str
+    y: str
+    t_min: float = Field(default=0, alias="tMin")
+    t_max: float = Field(default=tau, alias="tMax")
+
+
+class PolarCurveData(BaseModel):
+    r: str
+    theta_min: float = Field(default=0, alias="thetaMin")
+    theta_max: float = Field(default=tau, alias="thetaMax")
 
 
 class PlotData(BaseModel):
-    functions: list[str]
+    functions: list[str] = []
+    parametric: list[ParametricCurveData] = []
+    polar: list[PolarCurveData] = []
     x_min: int = Field(alias="xMin")
     x_max: int = Field(alias="xMax")
     y_min: int = Field(alias="yMin")
@@ -34,8 +54,60 @@ class PlotData(BaseModel):
         return self.y_min, self.y_max
 
 
+class PlotPointsData(PlotData):
+    width: int = Field(default=800, ge=3, le=10_000)
+    format: Literal["json", "float32"] = "json"
+
+
+class PlotImageData(PlotData):
+    format: Literal["png", "svg", "webp", "auto"] = "auto"
+    filename: str | None = None
+
+
+class SurfacePlotData(PlotData):
+    kind: Literal["surface", "heatmap", "contour", "grid"] = "contour"
+    resolution: int | None = Field(default=None, ge=2, le=1000)
+    format: Literal["png", "svg", "webp", "auto"] = "auto"
+
+
+class FormulaPlotData(BaseModel):
+    find_mark: str = Field(alias="findMark")
+    argument: str
+    values: dict[str, float] = {}
+    units: dict[str, str] = {}
+    x_min: float = Field(alias="xMin")
+    x_max: float = Field(alias="xMax")
+    y_min: float | None = Field(default=None, alias="yMin")
+    y_max: float | None = Field(default=None, alias="yMax")
+    width: int = Field(default=800, ge=3, le=10_000)
+    format: Literal["json", "png", "svg", "webp", "auto"] = "json"
+
+    @property
+    def x_lim(self) -> tuple[float, float]:
+        return self.x_min, self.x_max
+
+    @property
+    def y_lim(self) -> tuple[float, float] | None:
+        if self.y_min is None or self.y_max is None:
+            return None
+        return self.y_min, self.y_max
+
+
 class EquationsData(BaseModel):
     equations: list[str]
+    exact: bool = False
+    numeric: bool = False
+    initial_guess: dict[str, float] | None = Field(default=None, alias="initialGuess")
+    tolerance: float = Field(default=1e-10, gt=0)
+    max_iterations: int = Field(default=50, alias="maxIterations", gt=0, le=1000)
+
+
+class EquationsBatchData(BaseModel):
+    """Options of the single system solvers don't apply to batches and are rejected."""
+    model_config = ConfigDict(extra="forbid")
+
+    equations: list[str]
+    coefficients: list[dict[str, float]] = Field(min_length=1, max_length=100_000)
 
 
 class DownloadPlot(BaseModel):
@@ -90,3 +162,15 @@ class FormulaDetailSchema(FormulaListSchema):
     info: dict
     category: CategorySchema
     science: ScienceListSchema
+
+
+class FormulaSnapshotSchema(FormulaListSchema):
+    info: dict | None = None
+
+
+class CategorySnapshotSchema(CategoryListSchema):
+    formulas: list[FormulaSnapshotSchema]
+
+
+class ScienceSnapshotSchema(ScienceListSchema):
+    categories: list[CategorySnapshotSchema]
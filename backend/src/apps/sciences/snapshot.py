@@ -0,0 +1,130 @@
+import asyncio
+import gzip
+import time
+from typing import Iterable, Mapping, NamedTuple, Optional
+
+from fastapi import Response
+
+from src.base.responses import get_type_adapter
+from src.services.formulas.metadata import Formula as FormulaObject
+from .catalog import catalog_cache
+from .models import Science, Category, Formula
+from .schemas import ScienceSnapshotSchema
+
+try:
+    import brotli
+except ImportError:     # brotli variant is optional, gzip one is served then
+    brotli = None
+
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+# server preference for equally acceptable encodings
+ENCODINGS = "br", "gzip", "identity"
+# writes of other workers are unknown while the catalog cache is bypassed
+SNAPSHOT_BYPASS_MAX_AGE = 60
+
+
+class Snapshot(NamedTuple):
+    """Whole catalog tree JSON encoded once: encoding -> body."""
+    bodies: dict[str, bytes]
+
+    def response(self, accept_encoding: str, headers: Optional[Mapping[str, str]] = None) -> Response:
+        encoding = choose_encoding(accept_encoding, self.bodies)
+        response = Response(self.bodies[encoding], media_type="application/json", headers=headers)
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+
+def parse_accept_encoding(accept_encoding: str) -> dict[str, float]:
+    """:return quality values of encodings from Accept-Encoding header."""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        encoding, *params = (part.strip() for part in item.split(";"))
+        if not encoding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[encoding.lower()] = quality
+    return accepted
+
+
+def choose_encoding(accept_encoding: str, available: Iterable[str]) -> str:
+    """:return the most acceptable available encoding, identity if none is acceptable."""
+    accepted = parse_accept_encoding(accept_encoding)
+    default = accepted.get("*", 0.0)
+    accepted.setdefault("identity", accepted.get("*", 1.0))
+    # equally acceptable encodings are chosen in the order of server preference
+    qualities = {encoding: accepted.get(encoding, default) for encoding in ENCODINGS if encoding in available}
+    encoding = max(qualities, key=qualities.get)
+    return encoding if qualities[encoding] > 0 else "identity"
+
+
+def compress_snapshot(content: bytes) -> Snapshot:
+    bodies = {"identity": content, "gzip": gzip.compress(content, GZIP_LEVEL, mtime=0)}
+    if brotli is not None:
+        bodies["br"] = brotli.compress(content, quality=BROTLI_QUALITY)
+    return Snapshot(bodies)
+
+
+async def build_snapshot() -> Snapshot:
+    """Load the catalog tree in three queries, compression is done in a thread."""
+    formulas = {}
+    for formula in await Formula.all().order_by("title"):
+        formula_obj = FormulaObject.from_dict(formula.data)
+        formulas.setdefault(formula.category_id, []).append({
+            **formula.as_dict(),
+            "info": None if formula_obj is None else formula_obj.as_dict()
+        })
+    categories = {}
+    for category in await Category.all():
+        categories.setdefault(category.science_id, []).append({
+            **category.as_dict(),
+            "formulas": formulas.get(category.id, [])
+        })
+    sciences = [
+        {**science.as_dict(), "categories": categories.get(science.id, [])}
+        for science in await Science.all()
+    ]
+    adapter = get_type_adapter(list[ScienceSnapshotSchema])
+    content = adapter.dump_json(adapter.validate_python(sciences))
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, compress_snapshot, content)
+
+
+class SnapshotCache:
+    """
+    The last snapshot built, with the catalog version and modification time it was built for.
+    It's kept while the catalog cache is bypassed too, rebuilt then at most once in SNAPSHOT_BYPASS_MAX_AGE.
+    Concurrent requests wait for a single build.
+    """
+
+    def __init__(self):
+        self.snapshot: Optional[Snapshot] = None
+        self.key: Optional[tuple[int, float]] = None
+        self.built = 0.0
+        self._lock = asyncio.Lock()
+
+    def is_fresh(self, key: tuple[int, float]) -> bool:
+        if self.snapshot is None or key != self.key:
+            return False
+        return catalog_cache.listening or time.monotonic() - self.built < SNAPSHOT_BYPASS_MAX_AGE
+
+    async def get(self) -> Snapshot:
+        async with self._lock:
+            # a version changed during the build doesn't match the key, so the snapshot is rebuilt next time
+            key = catalog_cache.version, catalog_cache.modified
+            if not self.is_fresh(key):
+                self.snapshot = await build_snapshot()
+                self.key, self.built = key, time.monotonic()
+            return self.snapshot
+
+
+snapshot_cache = SnapshotCache()
@@ -0,0 +1,14 @@
+import asyncio
+
+from src.core.worker import app
+from .catalog import catalog_cache
+from .models import Category
+
+
+@app.task
+def recount_formulas_task() -> int:
+    """Repair formulas counts of categories after bulk changes of formulas."""
+    loop = asyncio.get_event_loop()
+    updated = loop.run_until_complete(Category.recount_formulas())
+    loop.run_until_complete(catalog_cache.publish_invalidation())
+    return updated
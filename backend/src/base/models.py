@@ -1,3 +1,4 @@
+from functools import lru_cache
 from tortoise import fields
 from tortoise.models import Model
 from uuid import uuid4
@@ -6,10 +7,17 @@ from uuid import uuid4
 class TortoiseModel(Model):
     id = fields.CharField(max_length=255, pk=True, default=lambda: str(uuid4()))
 
+    @classmethod
+    @lru_cache(maxsize=None)
+    def get_dict_fields(cls) -> tuple[tuple[str, ...], str]:
+        """:return names of data fields and of primary key, described once per model class."""
+        schema = cls.describe()
+        return tuple(field['name'] for field in schema['data_fields']), schema['pk_field']['name']
+
     def as_dict(self):
-        schema = self.describe()
-        dicted = {field['name']: getattr(self, field['name']) for field in schema['data_fields']}
-        dicted[schema['pk_field']['name']] = str(getattr(self, schema['pk_field']['name']))
+        data_fields, pk_field = self.get_dict_fields()
+        dicted = {name: getattr(self, name) for name in data_fields}
+        dicted[pk_field] = str(getattr(self, pk_field))
         return dicted
 
     def update_from_dict(self, data: dict):
@@ -0,0 +1,66 @@
+import base64
+import json
+from typing import NamedTuple, Optional
+
+from fastapi import HTTPException, Query
+from tortoise.expressions import Q
+from tortoise.queryset import QuerySet
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class Pagination(NamedTuple):
+    cursor: Optional[str]
+    limit: int
+
+
+def get_pagination(
+        cursor: Optional[str] = None,
+        limit: int = Query(default=PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+) -> Pagination:
+    return Pagination(cursor, limit)
+
+
+def encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode().rstrip("=")
+
+
+def decode_cursor(queryset: QuerySet, ordering: tuple[str, ...], cursor: str) -> list:
+    """:return values of ordering fields the cursor points after, converted by the model fields."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise ValueError
+        fields_map = queryset.model._meta.fields_map
+        return [
+            fields_map[field.lstrip("-")].to_python_value(value)
+            for field, value in zip(ordering, values)
+        ]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor is invalid.")
+
+
+def after_cursor(ordering: tuple[str, ...], values: list) -> Q:
+    """Condition of rows following `values` in `ordering`, `-` prefixed fields are descending."""
+    conditions = []
+    for i, field in enumerate(ordering):
+        equal = {previous.lstrip("-"): value for previous, value in zip(ordering[:i], values)}
+        lookup = f"{field.lstrip('-')}__{'lt' if field.startswith('-') else 'gt'}"
+        conditions.append(Q(**equal, **{lookup: values[i]}))
+    return Q(*conditions, join_type="OR")
+
+
+async def paginate(queryset: QuerySet, ordering: tuple[str, ...], pagination: Pagination) -> tuple[list, Optional[str]]:
+    """
+    Keyset pagination of the queryset, ordering fields must identify a row.
+    :return page objects and cursor of the next page, None for the last page.
+    """
+    if pagination.cursor is not None:
+        queryset = queryset.filter(after_cursor(ordering, decode_cursor(queryset, ordering, pagination.cursor)))
+    objects = await queryset.order_by(*ordering).limit(pagination.limit + 1)
+    if len(objects) <= pagination.limit:
+        return objects, None
+    objects = objects[:pagination.limit]
+    return objects, encode_cursor([getattr(objects[-1], field.lstrip("-")) for field in ordering])
@@ -0,0 +1,24 @@
+from functools import lru_cache
+from typing import Any, Optional
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+
+@lru_cache(maxsize=None)
+def get_type_adapter(schema: Any) -> TypeAdapter:
+    return TypeAdapter(schema)
+
+
+def schema_response(schema: Any, data: Any, response: Optional[Response] = None) -> Response:
+    """
+    JSON response of data dumped by the schema in a single pass of pydantic core,
+    instead of route response model processing: encoding to builtins, validation, serialization and stdlib json.
+    Headers set to the `response` parameter of the view are kept.
+    """
+    adapter = get_type_adapter(schema)
+    return Response(
+        adapter.dump_json(adapter.validate_python(data)),
+        media_type="application/json",
+        headers=None if response is None else response.headers
+    )
@@ -1,24 +1,30 @@
+import asyncio
 import logging
 import sys
 
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from starlette.middleware.authentication import AuthenticationMiddleware
 from starlette.staticfiles import StaticFiles
 
 from src.apps import __routers__
+from src.apps.sciences.catalog import catalog_cache
 from src.core.config import get_app_settings
+from src.core.middleware.queries import query_count_middleware
 from src.core.middleware.time import process_time_middleware
 from .middleware.cors import use_cors_middleware
 from .middleware.authentication import AuthenticationBackend
 from src.db.events import create_superuser, register_db
+from src.db.queries import install_query_recorder
 from src.db.redis import create_redis_client
+from src.services.formulas.plots import shutdown_render_executor
 
 
 class Application:
 
     def __init__(self):
         self._settings = get_app_settings()
-        self._app = FastAPI(debug=self.settings.DEBUG)
+        self._app = FastAPI(debug=self.settings.DEBUG, default_response_class=ORJSONResponse)
 
         self._configurate_db()
         self._configurate_app()
@@ -52,6 +58,7 @@ class Application:
         logger_db_client = logging.getLogger("tortoise.db_client")
         logger_db_client.setLevel(getattr(logging, "DEBUG"))
         logger_db_client.addHandler(sh)
+        install_query_recorder()
         # auth manager settings
         self.app.mount("/static", StaticFiles(directory="src/public/static/"), name="static")
         self.app.state.STATIC_DIR = "src/public/static/"
@@ -60,6 +67,7 @@ class Application:
         use_cors_middleware(self.app)
         self.app.add_middleware(AuthenticationMiddleware, backend=AuthenticationBackend())
         self.app.middleware("http")(process_time_middleware)
+        self.app.middleware("http")(query_count_middleware)
 
     def _configurate_db(self) -> None:
         """Configurate database."""
@@ -91,7 +99,10 @@ class Application:
     async def _on_startup_event(self):
         """Startup handler."""
         await self._load_data()
+        self.app.state.catalog_listener = asyncio.create_task(catalog_cache.listen(self.app.state.redis))
 
     async def _on_shutdown_event(self):
         """Shutdown handler."""
+        shutdown_render_executor()
+        self.app.state.catalog_listener.cancel()
         # self._smpt_server.close()
@@ -10,4 +10,5 @@ def use_cors_middleware(app: FastAPI) -> None:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", "X-Plot-Lengths", "X-Grid-Shape"],
     )
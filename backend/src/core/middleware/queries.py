@@ -0,0 +1,20 @@
+from fastapi import Request, Response
+import logging
+
+from src.db.queries import request_queries
+
+logger = logging.getLogger(__name__)
+
+
+async def query_count_middleware(request: Request, call_next) -> Response:
+    queries = []
+    token = request_queries.set(queries)
+    try:
+        response = await call_next(request)
+    finally:
+        request_queries.reset(token)
+    response.headers['X-Query-Count'] = str(len(queries))
+    budget = getattr(request.scope.get("endpoint"), "query_budget", None)
+    if budget is not None and len(queries) > budget:
+        logger.warning("%s made %d queries, its budget is %d", request.url.path, len(queries), budget)
+    return response
@@ -20,7 +20,7 @@ class AsyncCelery(Celery):
                 modules={
                     'models': [
                         # 'src.apps.users.models',
-                        # 'src.apps.sciences.models',
+                        'src.apps.sciences.models',
                         # 'src.apps.problems.models',
                         # 'src.apps.cabinets.models',
                     ]
@@ -49,4 +49,8 @@ app.conf.beat_schedule = {
         'task': 'src.apps.users.tasks.clear_activation_codes_task',
         'schedule': crontab(minute='*/15'),
     },
+    'Recount-Formulas': {
+        'task': 'src.apps.sciences.tasks.recount_formulas_task',
+        'schedule': crontab(minute=0, hour=4),
+    },
 }
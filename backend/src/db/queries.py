@@ -0,0 +1,35 @@
+import logging
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+QUERIES_LOGGER = "tortoise.db_client"
+
+request_queries: ContextVar[Optional[list[str]]] = ContextVar("request_queries", default=None)
+
+
+class QueryRecorder(logging.Filter):
+    """Records queries logged by Tortoise clients into the list of the current request."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        queries = request_queries.get()
+        if queries is not None and record.msg == "%s: %s":  # queries are logged with their values
+            queries.append(record.args[0])
+        return True
+
+
+def install_query_recorder() -> None:
+    logger = logging.getLogger(QUERIES_LOGGER)
+    if not any(isinstance(log_filter, QueryRecorder) for log_filter in logger.filters):
+        logger.addFilter(QueryRecorder())
+    if not logger.isEnabledFor(logging.DEBUG):
+        logger.setLevel(logging.DEBUG)
+
+
+def query_budget(budget: int):
+    """Decorator declaring how many queries a view may make, checked by the query count middleware and tests."""
+
+    def decorator(view_func: Callable):
+        view_func.query_budget = budget
+        return view_func
+
+    return decorator
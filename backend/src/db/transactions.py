@@ -0,0 +1,41 @@
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.transactions import in_transaction
+
+# callbacks of the outermost atomic block, None outside of it
+commit_callbacks: ContextVar[Optional[list[Callable[[], Awaitable]]]] = ContextVar("commit_callbacks", default=None)
+
+
+@asynccontextmanager
+async def atomic(using_db: Optional[BaseDBAsyncClient] = None) -> AsyncIterator[BaseDBAsyncClient]:
+    """
+    Transaction on `using_db` connection, joining its transaction if it is one.
+    Callbacks registered with `on_commit` inside run after the outermost atomic block commits,
+    writes in transactions opened by other means should be wrapped into atomic for that.
+    """
+    transaction = in_transaction() if using_db is None else using_db._in_transaction()
+    if commit_callbacks.get() is not None:
+        async with transaction as connection:
+            yield connection
+        return
+    callbacks = []
+    token = commit_callbacks.set(callbacks)
+    try:
+        async with transaction as connection:
+            yield connection
+    finally:
+        commit_callbacks.reset(token)
+    for callback in callbacks:
+        await callback()
+
+
+async def on_commit(callback: Callable[[], Awaitable]) -> None:
+    """Run the callback after the current atomic block commits, at once outside of it."""
+    callbacks = commit_callbacks.get()
+    if callbacks is None:
+        await callback()
+    elif callback not in callbacks:
+        callbacks.append(callback)
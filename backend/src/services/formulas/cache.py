@@ -0,0 +1,42 @@
+import hashlib
+import json
+
+from aioredis import Redis
+from aioredis.exceptions import RedisError
+
+from .mathem_extra_counter import canonical_system, equation_system, restore_names
+
+EQUATIONS_CACHE_TTL = 60 * 60 * 24
+# canonical form costs more than solving for big systems, only small ones are worth caching
+EQUATIONS_CACHE_MAX_LENGTH = 1000
+
+
+def get_system_key(canonical: list[str], exact: bool) -> str:
+    digest = hashlib.sha256("\n".join(canonical).encode()).hexdigest()
+    return f"equations:{int(exact)}:{digest}"
+
+
+async def cached_equation_system(redis: Redis, equations: list[str], exact: bool = False) -> dict:
+    """
+    `equation_system` with solutions of canonical systems cached in Redis.
+    Redis failures are not fatal: the system is solved without cache then.
+    """
+    if sum(map(len, equations)) > EQUATIONS_CACHE_MAX_LENGTH:
+        return equation_system(equations, exact)
+    try:
+        canonical, names = canonical_system(equations)
+    except Exception:
+        return equation_system(equations, exact)   # let the solver report invalid input
+    key = get_system_key(canonical, exact)
+    try:
+        cached = await redis.get(key)
+    except RedisError:
+        cached = None
+    if cached is not None:
+        return restore_names(json.loads(cached), names)
+    result = equation_system(canonical, exact)
+    try:
+        await redis.set(key, json.dumps(result), ex=EQUATIONS_CACHE_TTL)
+    except RedisError:
+        pass
+    return restore_names(result, names)
@@ -2,7 +2,7 @@ import numpy as np
 
 from src.apps.cabinets.models import History
 from src.apps.sciences.schemas import RequestSchema
-from src.services.formulas.metadata import Formula
+from src.services.formulas.metadata import CompiledSolution, Formula
 
 
 async def build_template(request: RequestSchema, formula_obj: Formula):
@@ -148,12 +148,25 @@ async def build_html(
     return tab_div, tab_content_divs
 
 
+def evaluate_solutions(solutions: tuple[CompiledSolution, ...], values: list[float]) -> tuple[float, dict]:
+    """:return first finite solution and its partial derivatives by every input literal."""
+    for solution in solutions:
+        evaluated = solution(*values)
+        if np.isfinite(evaluated[0]):
+            return float(evaluated[0]), {
+                literal: float(derivative) if np.isfinite(derivative) else None
+                for literal, derivative in zip(solution.inputs, evaluated[1:])
+            }
+    raise ArithmeticError
+
+
 def count_result(request: RequestSchema, formula_obj: Formula):
     params = formula_obj.literals
     args = formula_obj.args
     find_mark = args[0]
     result = ''
     message = ""
+    sensitivities = None
 
     try:
         # переменные, которые могут поменяться если будет POST метод
@@ -173,10 +186,15 @@ def count_result(request: RequestSchema, formula_obj: Formula):
                 si = np.append(si, float(params[arg].si[request.data[f"{arg}si"]]))
 
             # считать результат
-            result = formula_obj.match(
-                **dict(zip(find_args, nums * si))
-            )[0]
-            print(result, nums_comma)
+            solutions = formula_obj.solve_for(find_mark)
+            if solutions:
+                result, derivatives = evaluate_solutions(solutions, [float(num) for num in nums * si])
+                if request.sensitivities:
+                    sensitivities = derivatives
+            else:
+                result = formula_obj.match(
+                    **dict(zip(find_args, nums * si))
+                )[0]
             result = round(float(result), nums_comma)
 
     except (SyntaxError, NameError):
@@ -188,4 +206,4 @@ def count_result(request: RequestSchema, formula_obj: Formula):
     except ArithmeticError:
         message = "Вычислительно невозможное выражение"
 
-    return (result, True) if result else (message, False)
+    return (result, True, sensitivities) if result else (message, False, None)
@@ -1,12 +1,348 @@
+from collections import defaultdict
+from functools import lru_cache
+import re
+
+import numpy as np
 import sympy as sp
+from sympy.parsing.sympy_parser import standard_transformations, convert_xor
+
+CANONICAL_NAME = "_v{}_"
+CANONICAL_NAME_PATTERN = re.compile(r"_v(\d+)_")
+TRANSFORMATIONS = standard_transformations + (convert_xor, )
+BATCH_ENTRIES_LIMIT = 2_000_000     # matrix and right side entries of all instances, ~16 MB of float64
+
+
+class InconsistentSystemError(ValueError):
+    """Linear system has no solutions."""
+
+
+def parse_equations(equations) -> list[sp.Expr]:
+    """
+    Parse `left = right` strings into expressions equal to zero.
+    Expressions are left unevaluated: evaluating a long sum term by term is the slowest part of parsing.
+    """
+    expressions = []
+    for equation_ in equations:
+        left, right = equation_.split("=")
+        expressions.append(sp.Add(sp.parse_expr(left, transformations=TRANSFORMATIONS, evaluate=False),
+                                  -sp.parse_expr(f"({right})", transformations=TRANSFORMATIONS, evaluate=False),
+                                  evaluate=False))
+    return expressions
+
+
+def get_unknowns(expressions: list[sp.Expr]) -> list[sp.Symbol]:
+    return sorted(set().union(*(expression.free_symbols for expression in expressions)), key=str)
+
+
+def linear_coefficients(expression: sp.Expr, unknowns: set[sp.Symbol] | None = None) -> dict | None:
+    """
+    Coefficients of the expression by the unknowns (all its symbols by default),
+    the free term is stored by `1` key.
+    :return None if the expression is not linear in the unknowns.
+    """
+    if unknowns is None:
+        unknowns = expression.free_symbols
+    coefficients = defaultdict(lambda: sp.S.Zero)
+    stack = [(expression, sp.S.One)]
+    while stack:
+        term, scale = stack.pop()
+        if not term.free_symbols & unknowns:
+            coefficients[sp.S.One] += scale * term.doit()
+        elif term.is_Symbol:
+            coefficients[term] += scale
+        elif term.is_Add:
+            stack.extend((arg, scale) for arg in term.args)
+        elif term.is_Mul:
+            dependent = [arg for arg in term.args if arg.free_symbols & unknowns]
+            if len(dependent) != 1:
+                return None
+            independent = (arg.doit() for arg in term.args if not arg.free_symbols & unknowns)
+            stack.append((dependent[0], scale * sp.Mul(*independent)))
+        else:
+            return None
+    if any(coefficient.has(sp.I) for coefficient in coefficients.values()):
+        return None
+    return coefficients
+
+
+def solve_linear(expressions: list[sp.Expr], unknowns: list[sp.Symbol], exact: bool = False) -> dict | None:
+    """
+    Solve linear system numerically with `numpy.linalg` or exactly with `sympy.linsolve`.
+    :return None if the system is not linear.
+    """
+    rows = [linear_coefficients(expression) for expression in expressions]
+    if any(row is None for row in rows):
+        return None
+    if not exact and len(rows) == len(unknowns):
+        columns = {unknown: column for column, unknown in enumerate(unknowns)}
+        matrix = np.zeros((len(rows), len(unknowns)))
+        right = np.zeros(len(rows))
+        for number, row in enumerate(rows):
+            for key, coefficient in row.items():
+                if key == 1:
+                    right[number] = -float(coefficient)
+                else:
+                    matrix[number, columns[key]] = float(coefficient)
+        try:
+            result = np.linalg.solve(matrix, right)
+        except np.linalg.LinAlgError:
+            pass    # singular system has no or infinitely many solutions
+        else:
+            return {str(unknown): str(float(value)) for unknown, value in zip(unknowns, result)}
+    # linsolve keeps the system in sparse form, so it scales with the number of non-zero coefficients
+    solutions = sp.linsolve(
+        [sp.Add(*(key * coefficient for key, coefficient in row.items())) for row in rows],
+        unknowns
+    )
+    if not solutions:
+        raise InconsistentSystemError("Система уравнений несовместна.")
+    solution, = solutions
+    return {str(unknown): str(value) for unknown, value in zip(unknowns, solution) if unknown != value}
+
+
+def polynomial_roots(coefficients: np.ndarray, refine: bool = True) -> np.ndarray:
+    """
+    All roots of the polynomial as eigenvalues of its companion matrix (`numpy.roots`).
+    :param coefficients: from the highest power to the free term.
+    :param refine: polish the roots with Newton steps, keeping a step only if it lowers the residual.
+    """
+    roots = np.roots(coefficients)
+    if refine:
+        derivative = np.polyder(coefficients)
+        with np.errstate(all="ignore"):
+            for _ in range(3):
+                residual = np.polyval(coefficients, roots)
+                refined = roots - residual / np.polyval(derivative, roots)
+                roots = np.where(np.abs(np.polyval(coefficients, refined)) < np.abs(residual), refined, roots)
+    return roots
+
+
+def is_real_root(root: complex) -> bool:
+    return abs(root.imag) <= 1e-12 * max(abs(root), 1)
+
+
+def format_root(root: complex) -> str:
+    real = float(root.real) + 0.0     # drop the sign of negative zero
+    if is_real_root(root):
+        return str(real)
+    return f"{real} {'+' if root.imag >= 0 else '-'} {abs(root.imag)}*I"
+
+
+def solve_polynomial(expression: sp.Expr, unknown: sp.Symbol) -> dict | None:
+    """
+    Solve single variable polynomial equation numerically.
+    Repeated roots are ill-conditioned, so the roots are found for every square-free factor
+    of the polynomial and every distinct root is given once.
+    :return None if the expression is not a polynomial with numeric coefficients.
+    """
+    try:
+        poly = sp.Poly(expression.doit(), unknown)
+        if poly.degree() < 1:
+            return None
+        factors = [
+            np.array([complex(coefficient) for coefficient in factor.all_coeffs()])
+            for factor, _ in poly.sqf_list()[1]
+        ]
+    except (sp.PolynomialError, TypeError):
+        return None
+    roots = []
+    for coefficients in factors:
+        if not coefficients.imag.any():
+            coefficients = coefficients.real
+        roots.extend(polynomial_roots(coefficients).astype(complex))
+    roots = sorted(roots, key=lambda root: (not is_real_root(root), root.real, root.imag))
+    if len(roots) == 1:
+        return {str(unknown): format_root(roots[0])}
+    return {f"{unknown}{number}": format_root(root) for number, root in enumerate(roots, 1)}
+
+
+@lru_cache(maxsize=256)
+def compile_residuals(expressions: tuple[sp.Expr, ...], unknowns: tuple[sp.Symbol, ...]):
+    """Compile residuals of the system and their symbolic Jacobian to NumPy callables."""
+    residuals = sp.Matrix([expression.doit() for expression in expressions])
+    jacobian = residuals.jacobian(unknowns)
+    return (
+        sp.lambdify(unknowns, list(residuals), modules="numpy"),
+        sp.lambdify(unknowns, list(jacobian), modules="numpy"),
+    )
+
+
+def evaluate_stacked(function, points: np.ndarray, shape: tuple[int, ...]) -> np.ndarray:
+    """Evaluate compiled function at every point, :return array of (len(points), *shape)."""
+    # constant components come back as scalars, broadcasting them against a dummy row gives every one a value per point
+    with np.errstate(all="ignore"):
+        values = np.stack(np.broadcast_arrays(*function(*points.T), np.empty(len(points))))[:-1]
+    return np.moveaxis(values.astype(float), -1, 0).reshape(len(points), *shape)
+
+
+def newton_system(
+        expressions: list[sp.Expr],
+        unknowns: list[sp.Symbol],
+        initial_guess: dict | None = None,
+        tolerance: float = 1e-10,
+        max_iterations: int = 50,
+        starts: int = 16,
+) -> tuple[list[np.ndarray], dict]:
+    """
+    Damped Newton iterations from several starting points at once.
+    The first point is the initial guess, the others are spread around it.
+    :return distinct converged roots and convergence report.
+    """
+    residuals, jacobian = compile_residuals(tuple(expressions), tuple(unknowns))
+    size = len(expressions), len(unknowns)
+    guess = np.array([float((initial_guess or {}).get(str(unknown), 1)) for unknown in unknowns])
+    rng = np.random.default_rng(0)
+    points = guess + rng.normal(scale=np.maximum(np.abs(guess), 1) * 3, size=(starts, len(unknowns)))
+    points[0] = guess
+    norms = np.abs(evaluate_stacked(residuals, points, size[:1])).max(axis=1)
+    norms = np.where(np.isfinite(norms), norms, np.inf)    # points out of the domain aren't iterated
+    active = np.isfinite(norms) & (norms > tolerance)
+    iterations = 0
+    while active.any() and iterations < max_iterations:
+        iterations += 1
+        current = points[active]
+        values = evaluate_stacked(residuals, current, size[:1])
+        jacobians = evaluate_stacked(jacobian, current, size)
+        steps = -np.einsum("kij,kj->ki", np.linalg.pinv(jacobians), values)
+        damping = np.ones(len(current))
+        for _ in range(10):     # halve the step while it doesn't lower the residual
+            candidates = current + damping[:, None] * steps
+            candidate_norms = np.abs(evaluate_stacked(residuals, candidates, size[:1])).max(axis=1)
+            worse = ~(candidate_norms < norms[active])
+            if not worse.any():
+                break
+            damping[worse] /= 2
+        points[active] = candidates
+        norms[active] = np.where(np.isfinite(candidate_norms), candidate_norms, np.inf)
+        active &= norms > tolerance
+    converged = points[norms <= tolerance]
+    roots = []
+    for point in converged[np.argsort(norms[norms <= tolerance])]:
+        if not any(np.allclose(point, root, rtol=1e-6, atol=1e-6) for root in roots):
+            roots.append(point)
+    report = {
+        "starts": starts,
+        "converged": len(converged),
+        "iterations": iterations,
+        "residual": float(norms.min()) if np.isfinite(norms).any() else None,
+    }
+    return roots, report
+
+
+def numeric_equation_system(
+        equations,
+        initial_guess: dict | None = None,
+        tolerance: float = 1e-10,
+        max_iterations: int = 50,
+) -> dict:
+    """Solve system numerically, sympy is used only to compile residuals and Jacobian."""
+    try:
+        expressions = parse_equations(equations)
+        unknowns = get_unknowns(expressions)
+        roots, report = newton_system(expressions, unknowns, initial_guess, tolerance, max_iterations)
+    except Exception:
+        return {"result": {'Результат': "Ошибка в написании уравнения!"}}
+    if not roots:
+        return {"result": {'Результат': "Решение не найдено."}, "report": report}
+    roots = [{str(unknown): str(float(value)) for unknown, value in zip(unknowns, root)} for root in roots]
+    return {"result": roots[0], "roots": roots, "report": report}
+
+
+def canonical_system(equations) -> tuple[list[str], list[str]]:
+    """
+    Normalize the system, so that systems different only in whitespace,
+    equations order and variable naming mostly get the same form:
+    equations are parsed, sorted by their shape and symbols are renamed by first appearance.
+    :return canonical equations and original names of the canonical symbols.
+    """
+    expressions = []
+    for expression in parse_equations(equations):
+        expression = expression.doit()
+        expressions.append(-expression if expression.could_extract_minus_sign() else expression)
+    unknowns = get_unknowns(expressions)
+    blank = {unknown: sp.Symbol("_") for unknown in unknowns}
+    renaming = {}
+    for expression in sorted(expressions, key=lambda expression_: str(expression_.xreplace(blank))):
+        for node in sp.preorder_traversal(expression):
+            if node in blank and node not in renaming:
+                renaming[node] = sp.Symbol(CANONICAL_NAME.format(len(renaming)))
+    canonical = sorted(f"{expression.xreplace(renaming)} = 0" for expression in expressions)
+    return canonical, [str(unknown) for unknown in renaming]
+
+
+def restore_names(result: dict, names: list[str]) -> dict:
+    """Rename canonical symbols in keys and values of the solution back to the original names."""
+    def rename(text: str) -> str:
+        return CANONICAL_NAME_PATTERN.sub(lambda match: names[int(match.group(1))], text)
+
+    return {rename(key): rename(value) for key, value in result.items()}
+
+
+def batch_linear_system(equations, parameters: list[dict[str, float]]) -> dict:
+    """
+    Solve one templated linear system for many sets of its parameters.
+    The template is parsed once, all its instances are solved by a single stacked `numpy.linalg.solve`.
+    Matrices and right sides of all instances take not more than `BATCH_ENTRIES_LIMIT` entries.
+    :param parameters: values of the template symbols which are not unknowns, one dict per instance.
+    :return unknowns names and their values per instance, None for singular instances.
+    """
+    names = sorted(parameters[0])
+    if any(sorted(values) != names for values in parameters):
+        raise ValueError("Наборы коэффициентов должны содержать одни и те же параметры.")
+    try:
+        expressions = parse_equations(equations)
+    except Exception:
+        raise ValueError("Ошибка в написании уравнения!")
+    symbols = [sp.Symbol(name) for name in names]
+    unknowns = [symbol for symbol in get_unknowns(expressions) if str(symbol) not in names]
+    rows = [linear_coefficients(expression, set(unknowns)) for expression in expressions]
+    if any(row is None for row in rows):
+        raise ValueError("Система не является линейной.")
+    if len(rows) != len(unknowns):
+        raise ValueError("Число уравнений должно совпадать с числом неизвестных.")
+    if len(parameters) * (len(unknowns) + 1) * len(unknowns) > BATCH_ENTRIES_LIMIT:
+        raise ValueError("Слишком много неизвестных или наборов коэффициентов.")
+    entries = [row.get(unknown, sp.S.Zero) for row in rows for unknown in unknowns]
+    entries += [-row.get(sp.S.One, sp.S.Zero) for row in rows]
+    values = np.array([[instance[name] for name in names] for instance in parameters], dtype=float)
+    evaluated = evaluate_stacked(sp.lambdify(symbols, entries, modules="numpy"), values, (len(entries), ))
+    size = len(unknowns)
+    matrices, rights = evaluated[:, :size * size].reshape(-1, size, size), evaluated[:, size * size:]
+    try:
+        solutions = np.linalg.solve(matrices, rights[..., None])[..., 0].tolist()
+    except np.linalg.LinAlgError:
+        # some instances are singular, the rest are solved one by one
+        solutions = []
+        for matrix, right in zip(matrices, rights):
+            try:
+                solutions.append(np.linalg.solve(matrix, right).tolist())
+            except np.linalg.LinAlgError:
+                solutions.append(None)
+    return {"unknowns": [str(unknown) for unknown in unknowns], "result": solutions}
 
 
-def equation_system(equations) -> dict:
+def equation_system(equations, exact: bool = False) -> dict:
     try:
-        result = sp.solve(
-            [sp.sympify("Eq(" + equation_.replace("=", ",") + ")") for equation_ in equations],
-            dict=True
-        )[0]
+        expressions = parse_equations(equations)
+        unknowns = get_unknowns(expressions)
+        result = solve_linear(expressions, unknowns, exact)
+        if result is None and not exact and len(expressions) == len(unknowns) == 1:
+            result = solve_polynomial(expressions[0], unknowns[0])
+        if result is None:
+            try:
+                solutions = sp.solve(
+                    [sp.sympify("Eq(" + equation_.replace("=", ",") + ")") for equation_ in equations],
+                    dict=True
+                )
+            except NotImplementedError:
+                solutions = []
+            if not solutions and not exact:
+                # sympy found nothing or can't solve it, numeric roots are better than none
+                roots, _ = newton_system(expressions, unknowns)
+                solutions = [dict(zip(unknowns, map(float, root))) for root in roots]
+            result = solutions[0]
+    except InconsistentSystemError as e:
+        return {'Результат': str(e)}
     except Exception:
         return {'Результат': "Ошибка в написании уравнения!"}
     else:
@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
 from collections import defaultdict
 from copy import deepcopy
+from functools import lru_cache
 from typing import Iterable, Optional
 
 import numpy as np    # noqa: F401
@@ -129,6 +130,56 @@ class Formula(BaseFormula):
         expr = self.pattern.subs(nums)
         return sp.solve(expr)
 
+    def solve_for(self, find_mark: str) -> tuple["CompiledSolution", ...]:
+        """Compiled solved forms of the formula for `find_mark` (cached per formula and literal)."""
+        return compile_solutions(self.formula, self.args, find_mark)
+
+
+class CompiledSolution:
+    """
+    Formula solved for one literal and compiled to NumPy together with
+    its partial derivatives by every other literal.
+    """
+    __slots__ = ("target", "inputs", "expression", "gradient", "_function")
+
+    def __init__(self, target: str, inputs: tuple[str, ...], expression: sp.Expr):
+        symbols = [sp.Symbol(literal) for literal in inputs]
+        self.target = target
+        self.inputs = inputs
+        self.expression = expression
+        self.gradient: tuple[sp.Expr, ...] = tuple(sp.diff(expression, symbol) for symbol in symbols)
+        self._function = sp.lambdify(symbols, [expression, *self.gradient], modules="numpy")
+
+    def __repr__(self) -> str:
+        return f"{self.target} = {self.expression}"
+
+    def __call__(self, *values) -> np.ndarray:
+        """
+        :return array of shape (1 + len(inputs), *broadcast shape of values):
+        the result followed by its derivative by each input.
+        Complex and undefined values are returned as nan.
+        """
+        with np.errstate(all="ignore"):
+            evaluated = np.stack(np.broadcast_arrays(*self._function(*values)))
+        if np.iscomplexobj(evaluated):
+            evaluated = np.where(np.isclose(evaluated.imag, 0), evaluated.real, np.nan)
+        return evaluated.astype(float)
+
+
+@lru_cache(maxsize=1024)
+def compile_solutions(formula: str, args: tuple[str, ...], find_mark: str) -> tuple[CompiledSolution, ...]:
+    """Solve `formula` for `find_mark` symbolically once and compile every solution."""
+    if find_mark not in args:
+        return ()
+    symbols = {literal: sp.Symbol(literal) for literal in args}
+    equation = sp.Eq(*(sp.sympify(side, locals=symbols) for side in formula.split("=")))
+    inputs = tuple(literal for literal in args if literal != find_mark)
+    try:
+        solutions = sp.solve(equation, symbols[find_mark])
+    except NotImplementedError:
+        return ()
+    return tuple(CompiledSolution(find_mark, inputs, solution) for solution in solutions)
+
 
 def literal_rename(literal: Literal, literal_symbol: str) -> Literal:
     new_literal = deepcopy(literal)
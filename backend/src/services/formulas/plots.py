@@ -1,9 +1,44 @@
-import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 import numpy as np
-from numpy import cos, sin, tan, pi, e, power, sqrt    # noqa: F401
-from typing import Optional
+from PIL import Image, features
+import sympy as sp
+from sympy.parsing.sympy_parser import standard_transformations, convert_xor
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+from tokenize import TokenError
+from typing import Callable, NamedTuple, Optional
 from abc import ABC, abstractmethod
-import re
+import asyncio
+import math
+
+from .metadata import Formula
+
+MATHEMATICAL_NAMES = {"e": sp.E, "pi": sp.pi, "abs": sp.Abs}
+TRANSFORMATIONS = standard_transformations + (convert_xor, )
+RENDER_WORKERS = 2
+COARSE_POINTS = 128     # adaptive sampling starts from the grid
+POINT_BUDGET = 4000     # and evaluates not more points per function
+MAX_DEPTH = 12
+TOLERANCE = 1e-3        # acceptable error relative to the y scale (~ a pixel)
+JUMP_RATIO = 0.25       # jumps larger than that part of the y scale are checked for discontinuity
+SVG_POINTS_LIMIT = 3000     # SVG of plots with more points is never smaller than raster
+IMAGE_MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml", "webp": "image/webp"}
+WEBP_SUPPORTED = features.check("webp")
+SURFACE_RESOLUTION = 200    # points per side of the grid for functions of two arguments
+CELL_BUDGET = 250_000       # max cells of the grid, keeps memory of a worker bounded
+CONTOUR_COLORMAPS = ("viridis", "plasma", "cividis")
+RELATION_GRID = 64          # cells per side of the coarse grid of implicit curves
+RELATION_SUBDIVISION = 4    # every crossed cell is split into that many cells per side
+RELATION_LEVELS = 2         # times crossed cells are split
+TILES_PER_VIEW = 4          # functions are sampled by tiles of power of two width, about that many per view
+TILE_BUDGET = POINT_BUDGET // (TILES_PER_VIEW + 1)  # a view not aligned to tiles covers one more
+TILES_CACHE_SIZE = 2048     # tiles of ~800 points, ~26 MB
+MIN_TILE_LEVEL = -40
+BACKGROUNDS_CACHE_SIZE = 16     # rendered backgrounds of ~2 MB
+
+render_executor = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="plot-render")
 
 
 class BasePlot(ABC):
@@ -20,84 +55,813 @@ class BasePlot(ABC):
         pass
 
 
+class Curve(NamedTuple):
+    """Curve of functions of a parameter: `x(t)` and `y(t)` of parametric kind or `r(θ)` of polar kind."""
+    kind: str
+    functions: tuple[str, ...]
+    tlim: tuple[float, float]
+
+    def __str__(self):
+        if self.kind == "polar":
+            return f"r = {self.functions[0]}"
+        return f"({', '.join(self.functions)})"
+
+
+@lru_cache(maxsize=512)
+def parse_function(function: str) -> sp.Expr:
+    try:
+        return sp.parse_expr(function, local_dict=MATHEMATICAL_NAMES, transformations=TRANSFORMATIONS)
+    except (SyntaxError, TokenError, TypeError, sp.SympifyError):
+        raise SyntaxError("Невалидные данные.")
+
+
+def is_relation(function: str | Curve) -> bool:
+    """Implicit relation of `x` and `y` like `x**2 + y**2 = 25` instead of a function."""
+    return isinstance(function, str) and "=" in function
+
+
+@lru_cache(maxsize=512)
+def parse_relation(function: str) -> sp.Expr:
+    """:return residual of the relation, `left - right`, which is zero on its curve."""
+    left, _, right = function.partition("=")
+    if "=" in right:
+        raise SyntaxError("Невалидные данные.")
+    return parse_function(left) - parse_function(right)
+
+
+def normalize_function(function: str | Curve) -> str:
+    """Same string for functions different only in formatting."""
+    if isinstance(function, Curve):
+        functions = ", ".join(normalize_function(coordinate) for coordinate in function.functions)
+        return f"{function.kind}({functions}; {float(function.tlim[0])}, {float(function.tlim[1])})"
+    if is_relation(function):
+        return f"{parse_relation(function)} = 0"
+    return str(parse_function(function))
+
+
+@lru_cache(maxsize=512)
+def compile_function(function: str) -> Callable[[np.ndarray], np.ndarray]:
+    """Parse function of one argument once and compile it to vectorized NumPy callable."""
+    expression = parse_function(function)
+    if len(expression.free_symbols) > 1:
+        raise ValueError("В функции определено несколько аргументов!")
+    argument = next(iter(expression.free_symbols), sp.Symbol("x"))
+    compiled = sp.lambdify(argument, expression, modules="numpy")
+
+    def evaluate(definers: np.ndarray) -> np.ndarray:
+        with np.errstate(all="ignore"):
+            definitions = np.asarray(compiled(definers))
+        if np.iscomplexobj(definitions):
+            definitions = np.where(definitions.imag == 0, definitions.real, np.nan)
+        return np.broadcast_to(definitions, definers.shape).astype(float)
+
+    return evaluate
+
+
+def sample_function(
+        function: str,
+        xlim: tuple,
+        ylim: Optional[tuple] = None,
+        budget: int = POINT_BUDGET,
+        scale: Optional[float] = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Adaptive sampling of the function, see `sample_adaptive`.
+    :return x and y coords of the function.
+    """
+    evaluate = compile_function(function)
+    x, (y, ) = sample_adaptive(lambda definers: evaluate(definers)[None], xlim, [ylim], budget, [scale])
+    return x, y
+
+
+def get_tile_level(xlim: tuple) -> int:
+    """Level of the tiles for the view: tiles of level `n` are `2 ** n` wide."""
+    span = abs(xlim[1] - xlim[0])
+    return max(math.ceil(math.log2(max(span, math.ldexp(1, MIN_TILE_LEVEL)) / TILES_PER_VIEW)), MIN_TILE_LEVEL)
+
+
+def get_scale_level(ylim: Optional[tuple]) -> Optional[int]:
+    """Level of the y scale of tiles: the power of two not above the view height, None to estimate the scale."""
+    if ylim is None:
+        return None
+    return max(math.floor(math.log2(max(abs(ylim[1] - ylim[0]), math.ldexp(1, MIN_TILE_LEVEL)))), MIN_TILE_LEVEL)
+
+
+@lru_cache(maxsize=TILES_CACHE_SIZE)
+def sample_tile(
+        function: str,
+        level: int,
+        index: int,
+        scale_level: Optional[int] = None,
+        offset: int = 0,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Function adaptively sampled over the tile `[index * 2 ** level, (index + 1) * 2 ** level]`,
+    with y scale of `2 ** scale_level` and visible y range of three scales from `offset` scales.
+    Tiles are cached, their arrays are read-only.
+    """
+    width = math.ldexp(1, level)
+    scale = ylim = None
+    if scale_level is not None:
+        scale = math.ldexp(1, scale_level)
+        ylim = (offset * scale, (offset + 3) * scale)
+    x, y = sample_function(
+        function, (index * width, (index + 1) * width), ylim, TILE_BUDGET, scale
+    )
+    x.flags.writeable = y.flags.writeable = False
+    return x, y
+
+
+def sample_tiled(function: str, xlim: tuple, ylim: Optional[tuple] = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Function sampled from the level-of-detail pyramid of cached tiles.
+    The level is chosen by the view width, so panning computes only newly exposed tiles
+    and zooming back and forth reuses tiles of the levels already seen.
+    The view height, when given, sets the y scale of the tiles rounded to a power of two,
+    the view bottom rounded down to the scale sets their visible y range, which covers the view.
+    :return x and y coords of the tiles covering the view, clipped to the view.
+    """
+    function = normalize_function(function)
+    low, high = sorted(xlim)
+    level, scale_level = get_tile_level(xlim), get_scale_level(ylim)
+    offset = 0 if ylim is None else math.floor(min(ylim) / math.ldexp(1, scale_level))
+    width = math.ldexp(1, level)
+    first = math.floor(low / width)
+    tiles = [
+        sample_tile(function, level, index, scale_level, offset)
+        for index in range(first, max(math.ceil(high / width), first + 1))
+    ]
+    # neighbour tiles share their boundary point
+    x = np.concatenate([tiles[0][0], *(tile_x[1:] for tile_x, _ in tiles[1:])])
+    y = np.concatenate([tiles[0][1], *(tile_y[1:] for _, tile_y in tiles[1:])])
+    start, end = max(np.searchsorted(x, low, side="right") - 1, 0), np.searchsorted(x, high) + 1
+    return x[start:end], y[start:end]
+
+
+def sample_parametric(
+        curve: Curve,
+        xlim: tuple,
+        ylim: Optional[tuple] = None,
+        budget: int = POINT_BUDGET,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Adaptive sampling of parametric or polar curve over its parameter range, see `sample_adaptive`.
+    Coordinates are evaluated together in one vectorized pass over the parameters.
+    :return x and y coords of the curve.
+    """
+    if curve.kind == "polar":
+        radius = compile_function(curve.functions[0])
+
+        def evaluate(angles: np.ndarray) -> np.ndarray:
+            radiuses = radius(angles)
+            return np.stack([radiuses * np.cos(angles), radiuses * np.sin(angles)])
+    elif curve.kind == "parametric":
+        abscissa, ordinate = map(compile_function, curve.functions)
+
+        def evaluate(parameters: np.ndarray) -> np.ndarray:
+            return np.stack([abscissa(parameters), ordinate(parameters)])
+    else:
+        raise ValueError("Неизвестный тип графика.")
+    _, (x, y) = sample_adaptive(evaluate, curve.tlim, [xlim, ylim], budget)
+    return x, y
+
+
+def sample_adaptive(
+        evaluate: Callable[[np.ndarray], np.ndarray],
+        tlim: tuple,
+        limits: list[Optional[tuple]],
+        budget: int = POINT_BUDGET,
+        scales: Optional[list[Optional[float]]] = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Adaptive sampling of a curve, which coordinates are evaluated together from its parameter.
+    Starts from a coarse grid and repeatedly halves the intervals with large jumps, curvature
+    or domain edges of any coordinate, never evaluating more than `budget` points.
+    Lines are broken (nan inserted) at discontinuities, they take up to 1/16 of the budget.
+    :param evaluate: coordinates of shape (coordinates number, parameters number) from parameters.
+    :param limits: visible range of every coordinate, ranges of None are estimated from the coarse grid.
+    :param scales: scale of every coordinate errors are relative to, None for the visible range height.
+    :return parameters and coordinates.
+    """
+    t = np.linspace(tlim[0], tlim[1], min(COARSE_POINTS, budget))
+    values = evaluate(t)
+    given_scales, scales = scales or [None] * len(limits), []
+    for coordinate, limit, scale in zip(values, limits, given_scales):
+        finite = np.isfinite(coordinate)
+        if scale is not None:
+            scales.append(scale)
+        elif limit is not None:
+            scales.append(abs(limit[1] - limit[0]) or 1)
+        elif finite.any():
+            low, high = np.percentile(coordinate[finite], [2, 98])
+            scales.append(high - low or max(abs(high), 1))
+        else:
+            return t, values
+    breaks_budget = budget // 16
+    for _ in range(MAX_DEPTH):
+        badness = np.max([
+            interval_badness(clamp(coordinate, limit, scale), scale)
+            for coordinate, limit, scale in zip(values, limits, scales)
+        ], axis=0)
+        refine = np.flatnonzero(badness > TOLERANCE)
+        refine = refine[np.argsort(badness[refine])[::-1][:budget - breaks_budget - len(t)]]
+        if not len(refine):
+            break
+        refine.sort()
+        middle = (t[refine] + t[refine + 1]) / 2
+        t, values = np.insert(t, refine + 1, middle), np.insert(values, refine + 1, evaluate(middle), axis=1)
+    min_width = (tlim[1] - tlim[0]) / ((COARSE_POINTS - 1) << MAX_DEPTH)
+    breaks = np.unique(np.concatenate([
+        find_discontinuities(t, coordinate, scale, min_width, limit)[:breaks_budget]
+        for coordinate, limit, scale in zip(values, limits, scales)
+    ]))[:breaks_budget]
+    return np.insert(t, breaks + 1, t[breaks]), np.insert(values, breaks + 1, np.nan, axis=1)
+
+
+def clamp(coordinate: np.ndarray, limit: Optional[tuple], scale: float) -> np.ndarray:
+    """Coordinate clipped a scale away from its visible range, so parts far out of view aren't refined."""
+    if limit is None:
+        return coordinate
+    return np.clip(coordinate, min(limit) - scale, max(limit) + scale)
+
+
+def find_discontinuities(
+        x: np.ndarray,
+        y: np.ndarray,
+        scale: float,
+        min_width: float,
+        limit: Optional[tuple] = None,
+) -> np.ndarray:
+    """
+    Intervals with large jumps which are discontinuities:
+    refinement couldn't make them narrower or the jump goes against the slopes on both sides (a pole).
+    Jumps are measured within a scale from the visible range, slopes of the unclamped values are compared.
+    :return indexes of the intervals, largest jumps first.
+    """
+    with np.errstate(invalid="ignore"):
+        slopes = np.diff(y)
+        jumps = np.abs(np.diff(clamp(y, limit, scale))) > JUMP_RATIO * scale
+    if not jumps.any():
+        return np.array([], dtype=int)
+    direction = np.sign(np.nan_to_num(slopes))
+    before, after = np.r_[0, direction[:-1]], np.r_[direction[1:], 0]
+    against = (before == -direction) & (after == -direction)
+    saturated = np.diff(x) <= min_width * 2
+    breaks = np.flatnonzero(jumps & (against | saturated))
+    return breaks[np.argsort(np.abs(slopes[breaks]))[::-1]]
+
+
+def interval_badness(y: np.ndarray, scale: float) -> np.ndarray:
+    """
+    How badly every interval between neighbour samples is drawn as a straight line,
+    relative to the y scale: curvature at its ends, a jump which could be a discontinuity
+    or edge of the function domain. Steep straight lines are drawn well, their slope alone isn't refined.
+    """
+    with np.errstate(invalid="ignore"):
+        jumps = np.abs(np.diff(y)) / scale
+        curvature = np.abs(np.diff(y, 2)) / scale
+    jumps = np.where(jumps > JUMP_RATIO, np.nan_to_num(jumps, posinf=np.inf), 0)
+    curvature = np.r_[0, np.nan_to_num(curvature), 0]
+    badness = np.maximum(jumps, np.maximum(curvature[:-1], curvature[1:]))
+    finite = np.isfinite(y)
+    badness[finite[:-1] != finite[1:]] = np.inf
+    return badness
+
+
+def downsample_lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Largest-Triangle-Three-Buckets downsampling to `threshold` points.
+    Inner points are split into `threshold - 2` buckets, every bucket keeps the point
+    forming the largest triangle with averages of the neighbour buckets.
+    Using average of the previous bucket instead of its selected point
+    makes the buckets independent, so the whole pass is vectorized.
+    Lines broken by nan are downsampled by finite runs, keeping one nan for every break.
+    """
+    size = len(x)
+    if threshold >= size or threshold < 3:
+        return x, y
+    finite = np.isfinite(y)
+    if not finite.all():
+        return downsample_runs(x, y, finite, threshold)
+    edges = np.linspace(1, size - 1, threshold - 1).astype(int)
+    starts, counts = edges[:-1], np.diff(edges)
+    finite = np.isfinite(y[:-1])
+    finite_counts = np.add.reduceat(finite, starts)
+    with np.errstate(all="ignore"):
+        average_x = np.add.reduceat(x[:-1], starts) / counts
+        average_y = np.add.reduceat(np.where(finite, y[:-1], 0), starts) / finite_counts
+    previous_x, previous_y = np.r_[x[0], average_x[:-1]], np.r_[y[0], average_y[:-1]]
+    next_x, next_y = np.r_[average_x[1:], x[-1]], np.r_[average_y[1:], y[-1]]
+    buckets = np.repeat(np.arange(len(starts)), counts)
+    inner_x, inner_y = x[1:-1], y[1:-1]
+    with np.errstate(all="ignore"):
+        areas = np.abs(
+            (previous_x[buckets] - next_x[buckets]) * (inner_y - previous_y[buckets])
+            - (previous_x[buckets] - inner_x) * (next_y[buckets] - previous_y[buckets])
+        )
+    areas = np.where(np.isfinite(areas), areas, -1)
+    largest = areas == np.maximum.reduceat(areas, starts - 1)[buckets]
+    _, first_largest = np.unique(buckets[largest], return_index=True)
+    selected = np.r_[0, np.flatnonzero(largest)[first_largest] + 1, size - 1]
+    return x[selected], y[selected]
+
+
+def downsample_runs(x: np.ndarray, y: np.ndarray, finite: np.ndarray, threshold: int) -> tuple[np.ndarray, np.ndarray]:
+    """LTTB of every finite run of the line, thresholds are split by the runs lengths."""
+    runs = np.split(np.arange(len(x)), np.flatnonzero(np.diff(finite)) + 1)
+    finite_runs = sum(finite[run[0]] for run in runs)
+    available = max(threshold - (len(runs) - finite_runs), 2 * finite_runs)
+    pieces = []
+    for run in runs:
+        if not finite[run[0]]:
+            pieces.append((x[run[:1]], y[run[:1]]))
+            continue
+        pieces.append(downsample_lttb(x[run], y[run], max(available * len(run) // finite.sum(), 2)))
+    return np.concatenate([x_ for x_, _ in pieces]), np.concatenate([y_ for _, y_ in pieces])
+
+
 class Plot:
-    mathematical_names = {'cos', 'sin', 'tan', 'e', 'pi', 'sqrt', 'abs'}
-    pattern = r'\s|\*|\d|-|/|\+|\(|\)'
-    __step = 0.1
+    """
+    Plot of several functions on its own figure.
+    Uses object-oriented matplotlib API with Agg canvas,
+    so it doesn't share pyplot global state with plots built concurrently.
+    Plots with both limits given are blitted: only the lines are drawn over the cached background.
+    """
+    figsize = (7, 7)
+    blit = True
 
     def __init__(self, functions: list,
                  xlim: tuple,
                  ylim: Optional[tuple] = None):
         self.__functions = functions
-        self.__xlim = int(xlim[0]), int(xlim[1])
+        self.__xlim = float(xlim[0]), float(xlim[1])
         if ylim is not None:
-            self.__ylim = int(ylim[0]), int(ylim[1])
+            self.__ylim = float(ylim[0]), float(ylim[1])
         else:
             self.__ylim = None
-        self.__figure = plt.figure(figsize=(7, 7))
-        # try:
-        plt.xlim(self.__xlim)
-        plt.ylim(self.__ylim)
-        plt.grid()
+        self._figure = Figure(figsize=self.figsize)
+        FigureCanvasAgg(self._figure)
+        self._axes = self._create_axes()
+        self._axes.set_xlim(self.__xlim)
+        if self.__ylim is not None:
+            self._axes.set_ylim(self.__ylim)
+        self._axes.grid()
         self.set_plot()
-        # except:
-        #     raise ValueError("Невалидные данные")
+
+    @property
+    def xlim(self) -> tuple[float, float]:
+        return self.__xlim
+
+    @property
+    def ylim(self) -> Optional[tuple[float, float]]:
+        return self.__ylim
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _create_axes(self):
+        return self._figure.add_subplot()
+
+    def _vector_size(self) -> int:
+        """Number of points in vector image of the plot."""
+        return sum(len(line.get_xdata()) for line in self._axes.lines)
 
     def set_plot(self):
         """Построение графика всех функций"""
         for number, function in enumerate(self.__functions, 1):
             self.set_graphic(function, number)
 
-    def set_graphic(self, function: str, number: int):
+    def set_graphic(self, function: str | Curve, number: int):
         """Построение графика отдельной функции"""
-        # setattr(self,
-        #         f'__ax{number}',
-        #         self.__figure.add_subplot()
-        #         )
-        plt.plot(*self.__define(function))
-        # ax_ = getattr(self,
-        #               f'__ax{number}')
-        # ax_.plot(*self.__define(function))
-        # ax_.set_xlim(*self.__xlim)
-        # if self.__ylim:
-        #     ax_.set_ylim(*self.__ylim)
-        # ax_.grid()
-
-    def __define(self, function: str):
-        """:return x and y coords to define axis. len(x) == len(y)"""
-        function_argument = None
-        for i in filter(
-                self.__check_literals,
-                re.split(self.pattern, function)
-        ):
-            if i.isalpha():
-                if function_argument is None:
-                    function_argument = i
-                elif function_argument == i:
-                    pass
-                else:
-                    raise ValueError("В функции определено несколько аргументов!")
-        definers = np.arange(self.__xlim[0], self.__xlim[1], self.__step)
-        function = re.sub(r"(\S+\.?\S*)\s*\*\*\s*(-?\S+\.?\S*)", r"power(\1, \2)", function)
-        # print(function)
-        # ocs_to_replace = re.findall(r"\s*\S+\s*\*\*\s*[-+]?\d*[.,]?\d*", function)
-        # ocs_to_power = re.findall(r"\s*(\S+)\s*\*\*\s*([-+]?\d*[.,]?\d*)", function)
-        # print(ocs_to_power, ocs_to_replace)
-        # for element, replacement in zip(ocs_to_replace, ocs_to_power):
-        #     function = function.replace(element, 'power({}, {})'.format(*replacement))
-        definitions = np.array(
-            [eval(function.replace(function_argument, str(definer))) for definer in definers],
-            dtype=float,
-        )
-        return definers, definitions
+        self._axes.plot(*self.__define(function))
 
-    def __check_literals(self, literal: str) -> bool:
-        return bool(literal) and literal not in self.mathematical_names
+    def __define(self, function: str | Curve):
+        """:return x and y coords to define axis. len(x) == len(y)"""
+        return sample_curve(function, self.__xlim, self.__ylim)
 
     @staticmethod
-    def show():
-        plt.show()
+    def points(
+            functions: list,
+            xlim: tuple,
+            width: int,
+            ylim: Optional[tuple] = None,
+    ) -> list[tuple[np.ndarray, np.ndarray]]:
+        """
+        Sampled points of every function downsampled to `width` points, without rendering.
+        Implicit, parametric and polar curves are not downsampled, their x isn't monotonic.
+        """
+        xlim = int(xlim[0]), int(xlim[1])
+        return [
+            downsample_lttb(*sample_tiled(function, xlim, ylim), width)
+            if isinstance(function, str) and not is_relation(function)
+            else sample_curve(function, xlim, ylim)
+            for function in functions
+        ]
+
+    def save_plot(self, path: str):
+        self.__draw_raster().convert("RGB").save(path, format="png")
+
+    def to_bytes(self, image_format: str) -> bytes:
+        """Render the plot in memory. Raster formats are encoded from one Agg draw."""
+        if image_format == "svg":
+            buffer = BytesIO()
+            self._figure.savefig(buffer, format="svg")
+            return buffer.getvalue()
+        return self.__encode_raster(self.__draw_raster(), image_format)
+
+    def to_smallest_bytes(self) -> tuple[bytes, str]:
+        """
+        Render the plot in the format giving the least bytes:
+        lossless WebP or PNG, or SVG for plots with few points, which size grows with points number.
+        :return image and its format.
+        """
+        raster = self.__draw_raster()
+        candidates = [(self.__encode_raster(raster, "png"), "png")]
+        if WEBP_SUPPORTED:
+            candidates.append((self.__encode_raster(raster, "webp"), "webp"))
+        if self._vector_size() <= SVG_POINTS_LIMIT:
+            candidates.append((self.to_bytes("svg"), "svg"))
+        return min(candidates, key=lambda candidate: len(candidate[0]))
+
+    def __draw_raster(self) -> Image.Image:
+        canvas = self._figure.canvas
+        if self.blit and self.__ylim is not None:
+            canvas.restore_region(render_background(type(self), self.__xlim, self.__ylim))
+            for artist in (*self._axes.lines, *self._axes.spines.values()):
+                self._axes.draw_artist(artist)
+        else:
+            canvas.draw()
+        return Image.frombuffer("RGBA", canvas.get_width_height(), canvas.buffer_rgba(), "raw", "RGBA", 0, 1)
 
     @staticmethod
-    def save_plot(path: str):
-        plt.savefig(path)
+    def __encode_raster(raster: Image.Image, image_format: str) -> bytes:
+        buffer = BytesIO()
+        if image_format == "webp":
+            raster.save(buffer, format="webp", lossless=True)
+        else:
+            raster.convert("RGB").save(buffer, format="png", optimize=True)
+        return buffer.getvalue()
+
+    def close(self):
+        """Release the figure with all its artists."""
+        self._figure.clear()
+        self._figure = self._axes = None
+
+
+@lru_cache(maxsize=BACKGROUNDS_CACHE_SIZE)
+def render_background(plot_class: type[Plot], xlim: tuple, ylim: tuple):
+    """
+    Empty plot rendered once per plot class (figure size and style) and limits: axes, grid, ticks and labels.
+    Spines are left out, they are drawn over the lines.
+    """
+    with plot_class([], xlim, ylim) as plot:
+        for spine in plot._axes.spines.values():
+            spine.set_visible(False)
+        plot._figure.canvas.draw()
+        return plot._figure.canvas.copy_from_bbox(plot._figure.bbox)
+
+
+@lru_cache(maxsize=512)
+def compile_surface(function: str) -> Callable[[np.ndarray, np.ndarray], np.ndarray]:
+    """
+    Parse function of two arguments (or residual of a relation) once and compile it to vectorized NumPy callable.
+    `x` is the first argument and `y` the second one, other names are taken in alphabetical order.
+    """
+    expression = parse_relation(function) if is_relation(function) else parse_function(function)
+    if len(expression.free_symbols) > 2:
+        raise ValueError("В функции определено больше двух аргументов!")
+    x, y = sp.Symbol("x"), sp.Symbol("y")
+    arguments = sorted(expression.free_symbols, key=lambda symbol: (symbol != x, symbol == y, str(symbol)))
+    if arguments == [y]:
+        arguments.insert(0, x)
+    arguments += [x, y][len(arguments):]
+    compiled = sp.lambdify(arguments, expression, modules="numpy")
+
+    def evaluate(definers_x: np.ndarray, definers_y: np.ndarray) -> np.ndarray:
+        with np.errstate(all="ignore"):
+            definitions = np.asarray(compiled(definers_x, definers_y))
+        if np.iscomplexobj(definitions):
+            definitions = np.where(definitions.imag == 0, definitions.real, np.nan)
+        return np.broadcast_to(definitions, definers_x.shape).astype(float)
+
+    return evaluate
+
+
+def sample_surface(
+        function: str,
+        xlim: tuple,
+        ylim: tuple,
+        resolution: Optional[int] = None,
+        budget: int = CELL_BUDGET,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Evaluate function of two arguments over the whole grid at once.
+    Grid is square, `resolution` points per side, capped so the grid has not more than `budget` cells.
+    :return x, y and z of the grid, every of shape (resolution, resolution).
+    """
+    side = max(min(resolution or SURFACE_RESOLUTION, math.isqrt(budget)), 2)
+    definers_x, definers_y = np.meshgrid(np.linspace(*xlim, side), np.linspace(*ylim, side))
+    return definers_x, definers_y, compile_surface(function)(definers_x, definers_y)
+
+
+def sample_relation(
+        function: str,
+        xlim: tuple,
+        ylim: Optional[tuple] = None,
+        budget: int = CELL_BUDGET,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Curve of implicit relation by marching squares.
+    Residual is evaluated on a coarse grid in one pass, then only cells the curve crosses
+    are split and evaluated again, so the cost grows with the curve length, not the grid area.
+    Refinement stops earlier if the next level evaluates more than `budget` points.
+    :return x and y coords of the curve segments separated by nan.
+    """
+    ylim = ylim if ylim is not None else xlim
+    evaluate = compile_surface(function)
+    width, height = (xlim[1] - xlim[0]) / RELATION_GRID, (ylim[1] - ylim[0]) / RELATION_GRID
+    steps = np.arange(RELATION_GRID + 1)
+    z = evaluate(*np.meshgrid(xlim[0] + steps * width, ylim[0] + steps * height))[None]
+    left, bottom = np.zeros(1) + xlim[0], np.zeros(1) + ylim[0]
+    for level in range(RELATION_LEVELS + 1):
+        corners = np.stack([z[:, :-1, :-1], z[:, :-1, 1:], z[:, 1:, 1:], z[:, 1:, :-1]], axis=-1)
+        positive = corners > 0
+        crossed = np.isfinite(corners).all(axis=-1) & positive.any(axis=-1) & ~positive.all(axis=-1)
+        cell, row, column = np.nonzero(crossed)
+        left, bottom = left[cell] + column * width, bottom[cell] + row * height
+        corners = corners[cell, row, column]
+        points = len(cell) * (RELATION_SUBDIVISION + 1) ** 2
+        if level == RELATION_LEVELS or not len(cell) or points > budget:
+            break
+        width, height = width / RELATION_SUBDIVISION, height / RELATION_SUBDIVISION
+        steps = np.arange(RELATION_SUBDIVISION + 1)
+        z = evaluate(*np.broadcast_arrays(
+            left[:, None, None] + steps[None, None, :] * width,
+            bottom[:, None, None] + steps[None, :, None] * height,
+        ))
+    return march_squares(corners, left, bottom, width, height)
+
+
+def march_squares(
+        corners: np.ndarray,
+        left: np.ndarray,
+        bottom: np.ndarray,
+        width: float,
+        height: float,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Segments of the zero contour in every cell at once.
+    `corners` are residuals at bottom-left, bottom-right, top-right and top-left corners of the cells.
+    Saddle cells (crossed on all four edges) are resolved by the residual at the cell centre.
+    """
+    start, end = corners, np.roll(corners, -1, axis=-1)
+    crossed = (start > 0) != (end > 0)
+    with np.errstate(all="ignore"):
+        ratio = start / (start - end)
+    # edges go counterclockwise from the corner of the same index: top and left ones go backwards
+    ratio[:, 2:] = 1 - ratio[:, 2:]
+    edge_x = np.stack([ratio[:, 0], np.ones(len(left)), ratio[:, 2], np.zeros(len(left))], axis=-1)
+    edge_y = np.stack([np.zeros(len(left)), ratio[:, 1], np.ones(len(left)), ratio[:, 3]], axis=-1)
+    edge_x, edge_y = left[:, None] + edge_x * width, bottom[:, None] + edge_y * height
+    # two crossed edges of usual cells come first
+    order = np.argsort(~crossed, axis=-1, kind="stable")
+    saddle = crossed.all(axis=-1)
+    centre_like_first = (corners.mean(axis=-1) > 0) == (corners[:, 0] > 0)
+    order[saddle & centre_like_first] = [0, 1, 2, 3]
+    order[saddle & ~centre_like_first] = [0, 3, 1, 2]
+    pairs = np.r_[order[:, :2], order[saddle, 2:]]
+    cells = np.r_[np.arange(len(left)), np.flatnonzero(saddle)]
+    x = np.take_along_axis(edge_x[cells], pairs, axis=-1)
+    y = np.take_along_axis(edge_y[cells], pairs, axis=-1)
+    gaps = np.full((len(cells), 1), np.nan)
+    return np.hstack([x, gaps]).ravel(), np.hstack([y, gaps]).ravel()
+
+
+def sample_curve(
+        function: str | Curve,
+        xlim: tuple,
+        ylim: Optional[tuple] = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Points of a function, an implicit, parametric or polar curve."""
+    if isinstance(function, Curve):
+        return sample_parametric(function, xlim, ylim)
+    if is_relation(function):
+        return sample_relation(function, xlim, ylim)
+    return sample_tiled(function, xlim, ylim)
+
+
+class SurfacePlot(Plot):
+    """Plot of functions of two arguments as surface, heatmap or contour lines."""
+    kinds = ("surface", "heatmap", "contour")
+    blit = False
+
+    def __init__(self, functions: list,
+                 xlim: tuple,
+                 ylim: tuple,
+                 kind: str = "contour",
+                 resolution: Optional[int] = None):
+        if kind not in self.kinds:
+            raise ValueError("Неизвестный тип графика.")
+        self.__kind = kind
+        self.__resolution = resolution
+        super().__init__(functions, xlim, ylim)
+
+    def _create_axes(self):
+        if self.__kind == "surface":
+            return self._figure.add_subplot(projection="3d")
+        return self._figure.add_subplot()
+
+    def _vector_size(self) -> int:
+        if self.__kind == "contour":
+            return sum(len(path.vertices) for collection in self._axes.collections for path in collection.get_paths())
+        return SVG_POINTS_LIMIT + 1    # surfaces and heatmaps are always smaller as raster
+
+    def set_graphic(self, function: str, number: int):
+        x, y, z = sample_surface(function, self.xlim, self.ylim, self.__resolution)
+        if self.__kind == "surface":
+            self._axes.plot_surface(x, y, z, cmap="viridis")
+        elif self.__kind == "heatmap":
+            image = self._axes.imshow(z, extent=(*self.xlim, *self.ylim), origin="lower", aspect="auto")
+            self._figure.colorbar(image, ax=self._axes)
+        else:
+            contour = self._axes.contour(x, y, z, levels=10, cmap=CONTOUR_COLORMAPS[(number - 1) % 3])
+            self._axes.clabel(contour, fontsize=8)
+
+
+def compile_formula(
+        formula: Formula,
+        find_mark: str,
+        argument: str,
+        values: dict[str, float],
+        units: dict[str, str],
+) -> tuple[list[Callable[[np.ndarray], np.ndarray]], tuple[str, str]]:
+    """
+    Catalog formula solved for `find_mark` as functions of `argument` literal, one for every solution,
+    other literals fixed to `values`. Values, argument and result are in `units` (main units by default).
+    Functions evaluate compiled solutions of the formula, cached per formula and literal.
+    :return the functions and labels of x and y axes.
+    """
+    solutions = formula.solve_for(find_mark)
+    if not solutions:
+        raise ValueError("Формулу невозможно решить для этой величины.")
+    if argument not in solutions[0].inputs:
+        raise ValueError("Неизвестная величина.")
+    literals = formula.literals
+    for literal, unit in units.items():
+        if literal not in literals:
+            raise ValueError("Неизвестная величина.")
+        if unit not in literals[literal].si:
+            raise ValueError("Неизвестная единица измерения.")
+    scales = {literal: float(literals[literal].si[units.get(literal, literals[literal].ed)]) for literal in literals}
+    fixed = {}
+    for literal in solutions[0].inputs:
+        if literal == argument:
+            continue
+        value = values.get(literal, literals[literal].value)
+        if value is None:
+            raise ValueError("Неполные данные.")
+        fixed[literal] = value * scales[literal]
+
+    def compile_solution(solution) -> Callable[[np.ndarray], np.ndarray]:
+        def evaluate(definers: np.ndarray) -> np.ndarray:
+            arguments = [definers * scales[argument] if literal == argument else fixed[literal]
+                         for literal in solution.inputs]
+            return solution(*arguments)[0] / scales[find_mark]
+        return evaluate
+
+    labels = tuple(
+        f"{literals[literal].name}, {units.get(literal, literals[literal].ed)}" for literal in (argument, find_mark)
+    )
+    return [compile_solution(solution) for solution in solutions], labels
+
+
+def sample_formula(
+        formula: Formula,
+        find_mark: str,
+        argument: str,
+        values: dict[str, float],
+        units: dict[str, str],
+        xlim: tuple,
+        ylim: Optional[tuple] = None,
+) -> tuple[list[tuple[np.ndarray, np.ndarray]], tuple[str, str]]:
+    """
+    Adaptively sampled branches of the formula, see `compile_formula`.
+    Branches undefined in the whole range are skipped.
+    :return x and y coords of every branch and labels of the axes.
+    """
+    functions, labels = compile_formula(formula, find_mark, argument, values, units)
+    branches = []
+    for evaluate in functions:
+        x, (y, ) = sample_adaptive(lambda definers: evaluate(definers)[None], xlim, [ylim])
+        if np.isfinite(y).any():
+            branches.append((x, y))
+    if not branches:
+        raise ArithmeticError
+    return branches, labels
+
+
+class FormulaPlot(Plot):
+    """Plot of sampled branches of a catalog formula with axes labeled by literals and units."""
+    blit = False
+
+    def __init__(self, branches: list[tuple[np.ndarray, np.ndarray]],
+                 xlim: tuple,
+                 ylim: Optional[tuple] = None,
+                 labels: tuple[str, str] = ("", "")):
+        super().__init__(branches, xlim, ylim)
+        self._axes.set_xlabel(labels[0])
+        self._axes.set_ylabel(labels[1])
+
+    def set_graphic(self, function: tuple[np.ndarray, np.ndarray], number: int):
+        self._axes.plot(*function, color="C0")    # branches are one formula
+
+
+def render_plot(functions: list, xlim: tuple, ylim: Optional[tuple], path: str) -> None:
+    with Plot(functions, xlim, ylim) as plot:
+        plot.save_plot(path)
+
+
+async def render_plot_async(functions: list, xlim: tuple, ylim: Optional[tuple], path: str) -> None:
+    """Render plot in the bounded pool of render threads, so it doesn't block event loop."""
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(render_executor, render_plot, functions, xlim, ylim, path)
+
+
+async def plot_points_async(*args) -> list[tuple[np.ndarray, np.ndarray]]:
+    """`Plot.points` in the render pool, sampling parses, compiles and evaluates the functions."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(render_executor, Plot.points, *args)
+
+
+def render_plot_bytes(functions: list, xlim: tuple, ylim: Optional[tuple], image_format: str) -> tuple[bytes, str]:
+    """:return image in the format (the smallest one for `auto`) and the format."""
+    with Plot(functions, xlim, ylim) as plot:
+        if image_format == "auto":
+            return plot.to_smallest_bytes()
+        return plot.to_bytes(image_format), image_format
+
+
+async def render_plot_bytes_async(
+        functions: list,
+        xlim: tuple,
+        ylim: Optional[tuple],
+        image_format: str,
+) -> tuple[bytes, str]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(render_executor, render_plot_bytes, functions, xlim, ylim, image_format)
+
+
+def render_surface_bytes(
+        functions: list,
+        xlim: tuple,
+        ylim: tuple,
+        kind: str,
+        resolution: Optional[int],
+        image_format: str,
+) -> tuple[bytes, str]:
+    with SurfacePlot(functions, xlim, ylim, kind, resolution) as plot:
+        if image_format == "auto":
+            return plot.to_smallest_bytes()
+        return plot.to_bytes(image_format), image_format
+
+
+async def render_surface_bytes_async(*args) -> tuple[bytes, str]:
+    """`render_surface_bytes` in the render pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(render_executor, render_surface_bytes, *args)
+
+
+def render_formula_bytes(
+        formula: Formula,
+        find_mark: str,
+        argument: str,
+        values: dict[str, float],
+        units: dict[str, str],
+        xlim: tuple,
+        ylim: Optional[tuple],
+        image_format: str,
+) -> tuple[bytes, str]:
+    branches, labels = sample_formula(formula, find_mark, argument, values, units, xlim, ylim)
+    with FormulaPlot(branches, xlim, ylim, labels) as plot:
+        if image_format == "auto":
+            return plot.to_smallest_bytes()
+        return plot.to_bytes(image_format), image_format
+
+
+async def render_formula_bytes_async(*args) -> tuple[bytes, str]:
+    """`render_formula_bytes` in the render pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(render_executor, render_formula_bytes, *args)
+
+
+async def sample_formula_async(*args) -> tuple[list[tuple[np.ndarray, np.ndarray]], tuple[str, str]]:
+    """`sample_formula` in the render pool, the first call for a literal solves the formula."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(render_executor, sample_formula, *args)
+
+
+def shutdown_render_executor() -> None:
+    render_executor.shutdown(wait=False, cancel_futures=True)
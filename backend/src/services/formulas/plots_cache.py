@@ -0,0 +1,89 @@
+import hashlib
+import json
+import os
+from typing import Optional
+from uuid import uuid4
+
+from .plots import Plot, normalize_function, render_plot_async
+
+PLOTS_CACHE_DIR = "files/plots/cache/"
+PLOTS_CACHE_MAX_SIZE = 256 * 1024 * 1024
+PLOTS_CACHE_STYLE = "agg-png-v1"     # change to invalidate images rendered by older code
+
+
+class PlotCache:
+    """
+    Content-addressed cache of rendered plots on disk.
+    Image name is a hash of normalized functions, limits and style, so identical plots are rendered once.
+    Files' modification time is their last access time, the least recently used files are evicted.
+    """
+
+    def __init__(self, directory: str, max_size: int = PLOTS_CACHE_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def get_key(functions: list, xlim: tuple, ylim: Optional[tuple]) -> str:
+        data = {
+            "functions": [normalize_function(function) for function in functions],
+            "xlim": [int(limit) for limit in xlim],
+            "ylim": None if ylim is None else [int(limit) for limit in ylim],
+            "figsize": Plot.figsize,
+            "style": PLOTS_CACHE_STYLE,
+        }
+        return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+    def get_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.png")
+
+    def get(self, key: str) -> str | None:
+        """:return path to the cached image, marking it as recently used."""
+        path = self.get_path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    async def render(self, functions: list, xlim: tuple, ylim: Optional[tuple]) -> str:
+        """:return key of the image, rendering it only if it isn't cached."""
+        key = self.get_key(functions, xlim, ylim)
+        if self.get(key) is None:
+            # concurrent renders of the same plot write their own files and atomically replace the image
+            temporary_path = os.path.join(self.directory, f".{uuid4().hex}.png")
+            try:
+                await render_plot_async(functions, xlim, ylim, temporary_path)
+                os.replace(temporary_path, self.get_path(key))
+            finally:
+                if os.path.exists(temporary_path):
+                    os.remove(temporary_path)
+        return key
+
+    def evict(self) -> None:
+        """Remove the least recently used images until the cache is smaller than 90% of its max size."""
+        files = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.startswith(".") or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        size = sum(file_size for _, file_size, _ in files)
+        if size <= self.max_size:
+            return
+        for _, file_size, path in sorted(files):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= file_size
+            if size <= self.max_size * 0.9:
+                break
+
+
+def link_user_plot(link_path: str, image_path: str) -> None:
+    """Point per-user plot link at the cached image."""
+    temporary_link = os.path.join(os.path.dirname(link_path), f".{uuid4().hex}")
+    os.symlink(os.path.relpath(image_path, os.path.dirname(link_path)), temporary_link)
+    os.replace(temporary_link, link_path)
@@ -1,19 +1,22 @@
 import asyncio
 import pytest
 import pytest_asyncio
-from httpx import AsyncClient
+from httpx import AsyncClient, ASGITransport
 from fastapi import FastAPI, APIRouter
 from shutil import rmtree
 import os.path
 from tortoise import Tortoise
 
-from src.apps.users.routes import auth_router
-from src.apps.sciences.routes import science_router
-from src.apps.main.routes import main_router
-from src.apps.cabinets.routes import cabinets_router
-from src.apps.problems.routes import problems_router
-from src.core.app import Server
+from src.apps.users.routes import router as auth_router
+from src.apps.sciences.routes import router as science_router
+from src.apps.main.routes import router as main_router
+from src.apps.cabinets.routes import router as cabinets_router
+from src.core.app import Application
 from src.apps.users.models import User
+from src.data.load_data import load_all_data
+
+# problems app is removed, its tests are kept for reference
+collect_ignore = ["problems"]
 
 
 @pytest.fixture(scope="session")
@@ -23,7 +26,7 @@ def event_loop():
 
 @pytest_asyncio.fixture(scope='session')
 async def app() -> FastAPI:
-    server = Server()
+    server = Application()
     await Tortoise.init(
         {
             "connections": {
@@ -35,9 +38,7 @@ async def app() -> FastAPI:
             "apps": {
                 "models": {"models": [
                     'src.apps.users.models',
-                    'src.apps.main.models',
                     'src.apps.sciences.models',
-                    'src.apps.problems.models',
                     'src.apps.cabinets.models',
                 ], "default_connection": "default"}
             },
@@ -47,6 +48,7 @@ async def app() -> FastAPI:
     await Tortoise.generate_schemas()
     await clear_users()
     await server._load_data()
+    await load_all_data()
     yield server.app
     await clear_users()
     await Tortoise._drop_databases()
@@ -54,7 +56,7 @@ async def app() -> FastAPI:
 
 @pytest_asyncio.fixture
 async def client(app: FastAPI) -> AsyncClient:
-    async with AsyncClient(app=app, base_url="http://localhost:8000/api/v1/") as client_:
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://localhost:8000/api/") as client_:
         yield client_
 
 
@@ -64,6 +66,12 @@ def url_for(router: APIRouter):
     return inner
 
 
+def assert_query_budget(router: APIRouter, name: str, response) -> None:
+    """Assert that the response of the `name` route made no more queries than its budget."""
+    endpoint = next(route.endpoint for route in router.routes if route.name == name)
+    assert int(response.headers["X-Query-Count"]) <= endpoint.query_budget
+
+
 @pytest_asyncio.fixture
 def user1_data():
     return {
@@ -95,7 +103,7 @@ async def client_user1(client: AsyncClient, users_test_data: dict, user1_data: d
         "password": user1_data['password']
     }
     response = await client.post(
-        get_auth_url("get_token"),
+        get_auth_url("get_token_view"),
         json=user_token_data
     )
     access_token = response.json()["access_token"]
@@ -112,7 +120,7 @@ async def client_user2(client: AsyncClient, users_test_data: dict, user2_data: d
         "password": user2_data['password']
     }
     response = await client.post(
-        get_auth_url("get_token"),
+        get_auth_url("get_token_view"),
         json=user_token_data
     )
     access_token = response.json()["access_token"]
@@ -170,4 +178,3 @@ get_main_url = url_for(main_router)
 get_auth_url = url_for(auth_router)
 get_science_url = url_for(science_router)
 get_cabinet_url = url_for(cabinets_router)
-get_problem_url = url_for(problems_router)
@@ -1,6 +1,29 @@
+import json
+
+import pytest
 import pytest_asyncio
+from fastapi import FastAPI
+
+from src.apps.sciences.catalog import catalog_cache
+from src.apps.sciences.models import Science, Formula
+
+
+@pytest_asyncio.fixture(scope="session", autouse=True)
+async def formulas_metadata(app: FastAPI):
+    """Metadata of the formulas from formulas.json, formulas.csv has none."""
+    with open("src/data/files/formulas.json") as file:
+        formulas = json.load(file)
+    for data in formulas:
+        await Formula.filter(slug=data.pop("slug")).update(data=data)
+
 
-from src.apps.sciences.models import Science
+@pytest.fixture
+def listening_catalog():
+    """Catalog cache of a worker subscribed to invalidations, tests don't run the listener."""
+    catalog_cache.listening = True
+    yield catalog_cache
+    catalog_cache.listening = False
+    catalog_cache.reset(catalog_cache.version, catalog_cache.modified)
 
 
 @pytest_asyncio.fixture
@@ -1,18 +1,19 @@
 from fastapi import status
 
-from tests_api.conftest import get_science_url
+from tests_api.conftest import get_science_url, assert_query_budget, science_router
 
 
 class TestCategory:
 
     async def test_category_detail(self, client):
-        response = await client.get(get_science_url("category_get", category_slug="dinamika"))
+        response = await client.get(get_science_url("category_detail_view", category_slug="dinamika"))
         assert response.status_code == status.HTTP_200_OK
+        assert_query_budget(science_router, "category_detail_view", response)
         data = response.json()
-        assert "category" in data and "formulas" in data
-        assert data['category']['title'] == "Динамика"
+        assert "science" in data and "formulas" in data
+        assert data['title'] == "Динамика"
 
     async def test_category_not_found(self, client):
-        response = await client.get(get_science_url("category_get", category_slug="python_and_js"))
+        response = await client.get(get_science_url("category_detail_view", category_slug="python_and_js"))
         assert response.status_code == status.HTTP_404_NOT_FOUND
         assert response.json() == {"detail": "Category is not found."}
@@ -1,17 +1,18 @@
 from fastapi import status
 
-from tests_api.conftest import get_science_url
+from tests_api.conftest import get_science_url, assert_query_budget, science_router
 
 
 class TestFormula:
 
     async def test_formula_detail_get(self, client):
-        response = await client.get(get_science_url("formula_get", formula_slug="newton2"))
+        response = await client.get(get_science_url("formula_detail_view", formula_slug="newton2"))
         assert response.status_code == status.HTTP_200_OK
+        assert_query_budget(science_router, "formula_detail_view", response)
         data = response.json()
         assert "category" in data and "formula" in data and "info" in data
         assert data['category']['title'] == "Динамика"
-        assert data['formula']['title'] == "Второй закон Ньютона"
+        assert data['title'] == "Второй закон Ньютона"
         info = data['info']
         assert info == {
             "formula": "F = m * a",
@@ -57,7 +58,7 @@ class TestFormula:
         }
 
     async def test_formula_detail_not_found(self, client):
-        response = await client.get(get_science_url("formula_get", formula_slug="oop"))
+        response = await client.get(get_science_url("formula_detail_view", formula_slug="oop"))
         assert response.status_code == status.HTTP_404_NOT_FOUND
         assert response.json() == {"detail": "Formula is not found."}
 
@@ -70,7 +71,7 @@ class TestFormula:
             "find_mark": "F"
         }
         response = await client.post(
-            get_science_url("formula_post", formula_slug="newton2"),
+            get_science_url("formula_calculate_view", formula_slug="newton2"),
             json=data
         )
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
@@ -87,7 +88,7 @@ class TestFormula:
             "findMark": "F"
         }
         response = await client_user1.post(
-            get_science_url("formula_post", formula_slug="newton2"),
+            get_science_url("formula_calculate_view", formula_slug="newton2"),
             json=data
         )
         print(123123, response.json())
@@ -107,9 +108,75 @@ class TestFormula:
             "findMark": "m"
         }
         response = await client_user1.post(
-            get_science_url("formula_post", formula_slug="newton2"),
+            get_science_url("formula_calculate_view", formula_slug="newton2"),
             json=data
         )
         assert response.status_code == status.HTTP_200_OK
         assert "result" in response.json()
         assert response.json()['result'] == 1.23
+
+    async def test_formula_count_sensitivities(self, client_user1):
+        data = {
+            "data": {
+                "m": '123',
+                "msi": "kg",
+                "a": '100',
+                "asi": "m/s^2"
+            },
+            "numsComma": 2,
+            "findMark": "F",
+            "sensitivities": True
+        }
+        response = await client_user1.post(
+            get_science_url("formula_calculate_view", formula_slug="newton2"),
+            json=data
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()['result'] == 12300
+        assert response.json()['sensitivities'] == {"m": 100, "a": 123}
+
+    async def test_formula_plot(self, client_user1):
+        data = {
+            "findMark": "F",
+            "argument": "a",
+            "values": {"m": 123},
+            "units": {"m": "g", "F": "mN"},
+            "xMin": 0,
+            "xMax": 10,
+            "width": 50
+        }
+        response = await client_user1.post(
+            get_science_url("formula_plot_view", formula_slug="newton2"),
+            json=data
+        )
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data['xLabel'] == "acceleration, m/s^2" and data['yLabel'] == "Force, mN"
+        branch, = data['branches']
+        assert branch['x'][-1] == 10
+        assert branch['y'][-1] == 1230
+
+    async def test_formula_plot_unknown_unit(self, client_user1):
+        data = {
+            "findMark": "F",
+            "argument": "a",
+            "values": {"m": 123},
+            "units": {"m": "lbs"},
+            "xMin": 0,
+            "xMax": 10,
+        }
+        response = await client_user1.post(
+            get_science_url("formula_plot_view", formula_slug="newton2"),
+            json=data
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json() == {"detail": "Неизвестная единица измерения."}
+
+    async def test_formula_plot_without_metadata(self, client_user1):
+        data = {"findMark": "F", "argument": "a", "xMin": 0, "xMax": 10}
+        response = await client_user1.post(
+            get_science_url("formula_plot_view", formula_slug="peremeshenie"),
+            json=data
+        )
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert response.json() == {"detail": "Cannot find formula metadata."}
@@ -1,12 +1,15 @@
+import time
+
+import pytest
 from fastapi import status
 
-from tests_api.conftest import get_science_url
+from tests_api.conftest import get_science_url, assert_query_budget, science_router
 
 
 class TestScience:
 
     async def test_science_all(self, client):
-        response = await client.get(get_science_url('sciences_all'))
+        response = await client.get(get_science_url('sciences_list_view'))
         assert response.status_code == status.HTTP_200_OK
         data = response.json()
         assert len(data) == 2
@@ -16,21 +19,74 @@ class TestScience:
         assert mathem['title'] == "Математика"
         assert mathem['slug'] == "mathem"
 
+    async def test_science_all_paginated(self, client):
+        response = await client.get(get_science_url('sciences_list_view'), params={"limit": 1})
+        assert response.status_code == status.HTTP_200_OK
+        assert [science['slug'] for science in response.json()] == ["mathem"]
+        cursor = response.headers["X-Next-Cursor"]
+        response = await client.get(get_science_url('sciences_list_view'), params={"limit": 1, "cursor": cursor})
+        assert [science['slug'] for science in response.json()] == ["physics"]
+        assert "X-Next-Cursor" not in response.headers
+
+    async def test_science_all_cursor_exposed(self, client):
+        response = await client.get(
+            get_science_url('sciences_list_view'), params={"limit": 1}, headers={"Origin": "https://astrum.studio"}
+        )
+        assert "X-Next-Cursor" in response.headers["Access-Control-Expose-Headers"]
+
+    async def test_science_all_not_modified(self, client, listening_catalog):
+        response = await client.get(get_science_url('sciences_list_view'))
+        assert response.status_code == status.HTTP_200_OK
+        etag = response.headers["ETag"]
+        response = await client.get(get_science_url('sciences_list_view'), headers={"If-None-Match": etag})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.headers["X-Query-Count"] == "0"
+        listening_catalog.invalidate(listening_catalog.version + 1, time.time())
+        response = await client.get(get_science_url('sciences_list_view'), headers={"If-None-Match": etag})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["ETag"] != etag
+
+    async def test_science_all_invalid_cursor(self, client):
+        response = await client.get(get_science_url('sciences_list_view'), params={"cursor": "invalid"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json() == {"detail": "Cursor is invalid."}
+
+    async def test_science_snapshot(self, client):
+        response = await client.get(get_science_url('catalog_snapshot_view'), headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert response.headers["Vary"] == "Accept-Encoding"
+        assert_query_budget(science_router, "catalog_snapshot_view", response)
+        physics = next(science for science in response.json() if science['slug'] == "physics")
+        dinamika = next(category for category in physics['categories'] if category['title'] == "Динамика")
+        assert dinamika['formulas_count'] == len(dinamika['formulas'])
+        assert any(formula['slug'] == "newton2" for formula in dinamika['formulas'])
+
     async def test_science_detail(self, client, physics):
-        response = await client.get(get_science_url("science_get", science_slug="physics"))
+        response = await client.get(get_science_url("science_detail_view", science_slug="physics"))
         assert response.status_code == status.HTTP_200_OK
+        assert_query_budget(science_router, "science_detail_view", response)
         data = response.json()
-        assert 'science' in data
-        science_data = data['science']
-        assert science_data['title'] == physics.title
-        assert science_data['slug'] == physics.slug
-        assert science_data['content'] == physics.content
-        assert science_data['image_path'] == physics.image_path
-        assert "categories" in data and "id" in science_data
+        assert data['title'] == physics.title
+        assert data['slug'] == physics.slug
+        assert data['content'] == physics.content
+        assert data['image_path'] == physics.image_path
+        assert "categories" in data and "id" in data
         assert len(data['categories'])
         assert any(1 for i in data['categories'] if i['title'] == "Динамика")
 
+    @pytest.mark.parametrize("name, params", [
+        ("sciences_list_view", {}),
+        ("catalog_snapshot_view", {}),
+        ("science_detail_view", {"science_slug": "physics"}),
+        ("category_detail_view", {"category_slug": "dinamika"}),
+        ("formula_detail_view", {"formula_slug": "newton2"}),
+    ])
+    async def test_catalog_query_budgets(self, client, name, params):
+        response = await client.get(get_science_url(name, **params))
+        assert_query_budget(science_router, name, response)
+
     async def test_science_detail_not_found(self, client_user2):
-        response = await client_user2.get(get_science_url("science_get", science_slug="bio"))
+        response = await client_user2.get(get_science_url("science_detail_view", science_slug="bio"))
         assert response.status_code == status.HTTP_404_NOT_FOUND
         assert response.json() == {"detail": "Science is not found."}
@@ -4,7 +4,7 @@ import pytest_asyncio
 from fastapi import FastAPI
 from httpx import AsyncClient
 
-from src.apps.users.routes import auth_router
+from src.apps.users.routes import router as auth_router
 from src.apps.users.models import User
 from ..conftest import url_for
 from src.core.config import BaseAppSettings, AppEnvTypes
@@ -46,7 +46,7 @@ async def client_user1(client: AsyncClient, users_test_data: dict, user1_data: d
         "password": user1_data['password']
     }
     response = await client.post(
-        get_auth_url("get_token"),
+        get_auth_url("get_token_view"),
         json=user_token_data
     )
     access_token = response.json()["access_token"]
@@ -63,7 +63,7 @@ async def client_user2(client: AsyncClient, users_test_data: dict, user2_data: d
         "password": user2_data['password']
     }
     response = await client.post(
-        get_auth_url("get_token"),
+        get_auth_url("get_token_view"),
         json=user_token_data
     )
     access_token = response.json()["access_token"]
@@ -11,7 +11,7 @@ class TestMain:
             "login": "user1['username']"
         }
         response = await client.post(
-            get_auth_url("get_token"),
+            get_auth_url("get_token_view"),
             json=user_nonexisted_data
         )
         assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -24,7 +24,7 @@ class TestMain:
             "login": user1_data['username']
         }
         response = await client.post(
-            get_auth_url("get_token"),
+            get_auth_url("get_token_view"),
             json=user_existed_data
         )
         assert response.status_code == status.HTTP_200_OK
@@ -69,7 +69,7 @@ class TestMain:
             "login": user['username']
         }
         response = await client.post(
-            get_auth_url("get_token"),
+            get_auth_url("get_token_view"),
             json=user_existed_data
         )
         assert response.status_code == status.HTTP_400_BAD_REQUEST
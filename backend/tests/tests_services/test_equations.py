@@ -0,0 +1,111 @@
+import pytest
+
+from src.services.formulas.cache import cached_equation_system
+from src.services.formulas.mathem_extra_counter import equation_system, numeric_equation_system, \
+    canonical_system, restore_names, batch_linear_system
+
+
+class MemoryRedis:
+    """Redis of the equations cache in a dict."""
+
+    def __init__(self):
+        self.values = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.values[key] = value
+
+
+class TestLinear:
+
+    def test_numeric(self):
+        assert equation_system(["x + y = 1", "x - y = 0"]) == {"x": "0.5", "y": "0.5"}
+
+    def test_exact(self):
+        assert equation_system(["x + y = 1", "x - y = 0"], exact=True) == {"x": "1/2", "y": "1/2"}
+
+    def test_singular(self):
+        assert equation_system(["x + y = 1", "2*x + 2*y = 2"]) == {"x": "1 - y"}
+
+    def test_inconsistent(self):
+        assert equation_system(["x + y = 1", "x + y = 2"]) == {"Результат": "Система уравнений несовместна."}
+
+    def test_invalid(self):
+        assert equation_system(["x + = 1"]) == {"Результат": "Ошибка в написании уравнения!"}
+
+
+class TestPolynomial:
+
+    def test_real_roots(self):
+        assert equation_system(["x^2 = 4"]) == {"x1": "-2.0", "x2": "2.0"}
+
+    def test_complex_roots(self):
+        assert equation_system(["x**2 = -1"]) == {"x1": "0.0 - 1.0*I", "x2": "0.0 + 1.0*I"}
+
+    @pytest.mark.parametrize("equation, result", [
+        ("(x - 1)**3 = 0", {"x": "1.0"}),
+        ("x**2 - 2*x + 1 = 0", {"x": "1.0"}),
+        ("x**3 - x**2 = 0", {"x1": "0.0", "x2": "1.0"}),
+    ])
+    def test_repeated_roots(self, equation, result):
+        assert equation_system([equation]) == result
+
+
+class TestNewton:
+
+    def test_system(self):
+        result = numeric_equation_system(["x**2 + y**2 = 1", "x - y = 0"], {"x": 1, "y": 1})
+        assert result["result"] == {"x": "0.7071067811865476", "y": "0.7071067811865476"}
+        assert len(result["roots"]) == 2
+
+    def test_residual_out_of_domain(self):
+        result = numeric_equation_system(["sqrt(x) = 2"])
+        assert result["result"] == {"x": "4.0"}
+        assert result["report"]["residual"] == 0
+
+    def test_no_roots(self):
+        result = numeric_equation_system(["x**2 = -1"])
+        assert result["result"] == {"Результат": "Решение не найдено."}
+        assert result["report"]["converged"] == 0
+
+
+class TestCanonical:
+
+    def test_same_form(self):
+        canonical, names = canonical_system(["b - a = 1", "a + 2 = 0"])
+        assert canonical_system(["x+2=0", "y-x=1"]) == (canonical, ["x", "y"])
+        assert names == ["a", "b"]
+
+    def test_restore_names(self):
+        assert restore_names({"_v0_": "1 - _v1_"}, ["a", "b"]) == {"a": "1 - b"}
+
+    async def test_cache(self):
+        redis = MemoryRedis()
+        assert await cached_equation_system(redis, ["a + b = 3", "a - b = 1"]) == {"a": "2.0", "b": "1.0"}
+        assert len(redis.values) == 1
+        assert await cached_equation_system(redis, ["y - x = -1", "x + y = 3"]) == {"x": "2.0", "y": "1.0"}
+        assert len(redis.values) == 1
+
+
+class TestBatch:
+
+    def test_solutions(self):
+        result = batch_linear_system(["a*x + y = 1", "x - y = c"], [{"a": 1, "c": 0}, {"a": 3, "c": 1}])
+        assert result["unknowns"] == ["x", "y"]
+        assert result["result"] == [pytest.approx([0.5, 0.5]), pytest.approx([0.5, -0.5])]
+
+    def test_singular(self):
+        result = batch_linear_system(["a*x + y = 1", "x - y = 0"], [{"a": 1}, {"a": -1}])
+        assert result["result"] == [[0.5, 0.5], None]
+
+    @pytest.mark.parametrize("equations, parameters, message", [
+        (["a*x + y = 1", "x - y = 0"], [{"a": 1}, {"b": 1}], "Наборы коэффициентов должны"),
+        (["a*x*y = 1", "x - y = 0"], [{"a": 1}], "Система не является линейной."),
+        (["a*x + y = 1"], [{"a": 1}], "Число уравнений должно совпадать с числом неизвестных."),
+        (["a*x + y = 1", "x - y = 0"], [{"a": 1}] * 400_000, "Слишком много неизвестных или наборов коэффициентов."),
+    ])
+    def test_errors(self, equations, parameters, message):
+        with pytest.raises(ValueError, match=message):
+            batch_linear_system(equations, parameters)
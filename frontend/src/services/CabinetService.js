@@ -3,12 +3,13 @@ import {getHeaders} from "@/services/Auth";
 import axios from "axios";
 
 
-export function getHistoryList() {
+export function getHistoryList(cursor = null) {
     return axios
         .get(
             buildUrl("cabinet/history"),
             {
-                headers: getHeaders()
+                headers: getHeaders(),
+                params: {cursor: cursor}
             }
         );
 
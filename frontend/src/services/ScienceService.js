@@ -24,14 +24,15 @@ export function getScienceDetail(slug){
      return promise.then(response => response.data);
 }
 
-export function getCategoryDetail(slug){
+export function getCategoryDetail(slug, cursor = null){
      let promise = axios.get(
          buildUrl(`sciences/category/${slug}`),
          {
-             headers: getHeaders()
+             headers: getHeaders(),
+             params: {cursor: cursor}
          }
          );
-     return promise.then(response => response.data);
+     return promise.then(response => ({...response.data, nextCursor: response.headers['x-next-cursor'] || null}));
 }
 
 